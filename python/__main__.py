@@ -1,4 +1,5 @@
 import atexit
+import os
 import webdatatools as wd
 
 def simplecount_manual_input():
@@ -16,11 +17,11 @@ def simplecount_manual_input():
                     print('ERROR: Cannot finalize the update!')
                     return 'failure'
                 else:
-                    wd.database.update_output_years()
+                    wd.database.update_output_years(out_id_list=wd.simplecount.get_updated_outputs())
                     return 'success'
 
-def simplecount_auto_input(source_group_input, source_input):
-    """Implement business logic for automatically updating select data."""    
+def get_simplecount_source(source_group_input, source_input):
+    """Return the simplecount data source for the source group and source inputs."""
     if source_group_input not in range(2,6+1):
         raise ValueError('ERROR: Invalid source group input!')
 
@@ -33,8 +34,12 @@ def simplecount_auto_input(source_group_input, source_input):
         (6, 2): 'employment',
         (6, 3): 'poverty'
     }
-       
-    source = source_dict[(int(source_group_input), int(source_input))]
+
+    return source_dict[(int(source_group_input), int(source_input))]
+
+def simplecount_auto_input(source_group_input, source_input):
+    """Implement business logic for automatically updating select data."""    
+    source = get_simplecount_source(source_group_input, source_input)
     temp_created = wd.simplecount.fetch_input_and_create_temp(source, auto=True)
     if not temp_created:
         print(f'ERROR: Cannot create temporary tables for {source}!')
@@ -46,7 +51,41 @@ def simplecount_auto_input(source_group_input, source_input):
                 print('ERROR: Cannot finalize the update!')
                 return 'failure'
             else:
-                wd.database.update_output_years()
+                wd.database.update_output_years(out_id_list=wd.simplecount.get_updated_outputs())
+                return 'success'
+
+def simplecount_auto_input_all():
+    """Implement business logic for automatically updating data from all sources at once."""
+    print('WAIT: Fetching data from all sources...')
+    temp_created = wd.simplecount.fetch_all_and_create_temp()
+    if not temp_created:
+        print('ERROR: Cannot create temporary tables for any source!')
+        return 'failure'
+    else:
+        if wd.ui.prompt_for_confirmation('the temporary output is as expected'):
+            updated = wd.simplecount.finalize_update()
+            if not updated:
+                print('ERROR: Cannot finalize the update!')
+                return 'failure'
+            else:
+                wd.database.update_output_years(out_id_list=wd.simplecount.get_updated_outputs())
+                return 'success'
+
+def simplecount_backfill_input(sources, year_from, year_to):
+    """Implement business logic for automatically backfilling select data for a range of years."""
+    print(f'WAIT: Fetching data for {year_from}-{year_to}...')
+    temp_created = wd.simplecount.backfill_and_create_temp(year_from, year_to, sources)
+    if not temp_created:
+        print('ERROR: Cannot create temporary tables for any source!')
+        return 'failure'
+    else:
+        if wd.ui.prompt_for_confirmation('the temporary output is as expected'):
+            updated = wd.simplecount.finalize_update()
+            if not updated:
+                print('ERROR: Cannot finalize the update!')
+                return 'failure'
+            else:
+                wd.database.update_output_years(out_id_list=wd.simplecount.get_updated_outputs())
                 return 'success'
 
 def task_simplecount():
@@ -58,11 +97,31 @@ def task_simplecount():
     if simplecount_input == 'b':
         return 'back'
 
+    if simplecount_input == '3':
+        source_group_input = wd.ui.prompt_for_source_group_input('backfilling simplecount', True)
+        if source_group_input == 'b':
+            return 'back'
+        elif source_group_input == 'a':
+            sources = None
+        else:
+            source_input = wd.ui.prompt_for_data_source_input(int(source_group_input))
+            if source_input == 'b':
+                return 'back'
+            sources = [get_simplecount_source(int(source_group_input), int(source_input))]
+
+        year_range_input = wd.ui.prompt_for_year_range_input()
+        if year_range_input == 'b':
+            return 'back'
+
+        return simplecount_backfill_input(sources, *year_range_input)
+
     auto = True if simplecount_input == '1' else False
     if auto:
         source_group_input = wd.ui.prompt_for_source_group_input('updating simplecount', auto)
         if source_group_input == 'b':
             return 'back'
+        elif source_group_input == 'a':
+            return simplecount_auto_input_all()
 
         source_input = wd.ui.prompt_for_data_source_input(int(source_group_input))
         if source_input == 'b':
@@ -110,7 +169,7 @@ def task_dataset():
     package_input = wd.ui.prompt_for_dataset_package_input(int(source_group_input))
     if package_input == 'a':
         print('WAIT: Generating the datasets...')
-        generated = wd.outputtools.generate_packages_by_source_group(int(source_group_input))
+        generated = wd.outputtools.generate_packages_by_source_group(int(source_group_input), workers=os.cpu_count())
         print('NOTE: All datasets are generated!')
     elif package_input == 'b':
         return 'back'
@@ -124,6 +183,20 @@ def task_dataset():
     else:
         return 'success'
 
+def task_duplicates():
+    """Implement business logic for removing duplicate records from master tables."""
+    wd.database.init()
+
+    tables = wd.database.check_natural_keys()
+    if len(tables) == 0:
+        print('NOTE: No master table has duplicate records!')
+        return 'success'
+
+    for table in tables:
+        if wd.ui.prompt_for_confirmation(f'the most recent of the duplicate records in "{table}" can be kept'):
+            wd.database.remove_duplicates(table)
+    return 'success'
+
 @atexit.register
 def reset_env(exit=True):
     """Reset the environment by cleaning out all temporary outputs."""
@@ -166,6 +239,8 @@ def main():
             handle_task_result(task_population())
         elif task_code == '3':
             handle_task_result(task_dataset())
+        elif task_code == '4':
+            handle_task_result(task_duplicates())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
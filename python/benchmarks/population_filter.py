@@ -0,0 +1,112 @@
+"""Benchmark the Illinois filter of the CDC population estimates files.
+
+This script generates a synthetic national file in the layout of the
+Bridged-Race Population Estimates files, zipped as they are served by the
+CDC, and filters it for Illinois in two ways:
+
+``old`` reads the whole file with ``pandas.read_table()`` and matches each
+    line with a regular expression, as the ``population`` module did before.
+``new`` streams the file through ``population._fetch_data_helper()``.
+
+The time taken and peak memory traced by ``tracemalloc`` in a separate run
+are printed for each, and the script fails if the two ways keep different
+lines. Run it from the ``python`` directory, e.g.
+``python benchmarks/population_filter.py --lines 2000000``.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+import zipfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webdatatools import population
+
+def make_national_file(lines, seed):
+    """Return a zipped synthetic national population estimates file.
+
+    Each line has a run of digits for the series, then the state and county
+    FIPS codes, age, race-sex and Hispanic origin codes and a population
+    value of 8 characters, so that the state FIPS code is 17 characters from
+    the end of the line as in the CDC files. States take turns line by line.
+
+    Args:
+        lines (int): Number of lines in the file.
+        seed (int): Seed of the random values.
+
+    Returns:
+        bytes: Content of the zipped file.
+    """
+    rng = random.Random(seed)
+    states = [f'{i:02d}' for i in range(1, 57)]
+    buf = io.StringIO()
+    for n in range(lines):
+        buf.write(
+            '2019' * 10 + states[n % len(states)] +
+            f'{rng.randrange(1, 200, 2):03d}{rng.randint(0, 85):02d}' +
+            f'{rng.randint(1, 8)}{rng.randint(1, 2)}{rng.randint(0, 99999):8d}\n'
+        )
+
+    raw = io.BytesIO()
+    with zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('pcen.txt', buf.getvalue())
+    return raw.getvalue()
+
+def filter_old(content):
+    """Filter a zipped file for Illinois by reading it whole and matching a regular expression."""
+    z = zipfile.ZipFile(io.BytesIO(content))
+    df = pd.read_table(z.open(z.namelist()[0]), header=None, names=['raw_value'])
+    pattern = f'^\\d{{{df["raw_value"].str.len().max() - 17}}}17'
+    return df[df['raw_value'].str.contains(pattern)].reset_index(drop=True)
+
+def filter_new(content):
+    """Filter a zipped file for Illinois by streaming its lines."""
+    return population._fetch_data_helper(io.BytesIO(content))
+
+def measure(function, content):
+    """Return the result, seconds taken and peak traced memory in bytes of a filter.
+
+    The filter is run twice, since tracing memory slows down the many small
+    allocations of the streaming filter: once timed and once traced.
+    """
+    start = time.perf_counter()
+    result = function(content)
+    seconds = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = function(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Illinois filter of the CDC population estimates files.')
+    parser.add_argument('--lines', type=int, default=2000000, help='number of lines in the synthetic national file')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random values')
+    args = parser.parse_args()
+
+    # as set by ``population.init()``, which also connects to the database
+    population._BLOCK_SIZE = 1024 * 1024
+    content = make_national_file(args.lines, args.seed)
+    print(f'NOTE: Synthetic national file has {args.lines:,} lines ({len(content) / 1024**2:,.1f} MB zipped).')
+
+    results = {}
+    for name, function in [('old', filter_old), ('new', filter_new)]:
+        result, seconds, peak = measure(function, content)
+        results[name] = result['raw_value'].astype(str).tolist()
+        print(f'{name}: {len(result):,} lines kept in {seconds:.2f} seconds, peak memory {peak / 1024**2:,.1f} MB')
+
+    if results['old'] != results['new']:
+        print('ERROR: The old and new filters keep different lines!')
+        sys.exit(1)
+    print('NOTE: The old and new filters keep the same lines.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Shared fixtures of the tests of the ``webdatatools`` package.
+
+The tests are run from the ``python`` directory with ``python -m pytest tests``.
+The tests never connect to the MS SQL Server, so if ``pyodbc`` (or the ODBC
+driver manager it loads) is not available, a stand-in module with only its
+``Error`` class is registered so that ``webdatatools`` can be imported.
+"""
+import os
+import sqlite3
+import sys
+import types
+
+import pytest
+
+import standin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = types.ModuleType('pyodbc')
+    pyodbc.Error = type('Error', (Exception,), {})
+    sys.modules.setdefault('pyodbc', pyodbc)
+
+@pytest.fixture
+def simplecount():
+    """Return the ``simplecount`` module initialized with an empty in-memory database."""
+    from webdatatools import database, simplecount
+
+    database.CONN = sqlite3.connect(':memory:', check_same_thread=False)
+    simplecount.init()
+    yield simplecount
+    database.CONN.close()
+    del database.CONN
+
+@pytest.fixture
+def sql_server(tmp_path):
+    """Point the ``sqlserver`` module to a SQLite stand-in of the seeded source tables.
+
+    Returns:
+        str: Path of the SQLite file.
+    """
+    from webdatatools import sqlserver
+
+    path = str(tmp_path / 'standin.db')
+    standin.create_standin(path)
+
+    connect, table_format = sqlserver._CONNECT, sqlserver._TABLE_FORMAT
+    sqlserver.configure(
+        connect=lambda database: sqlite3.connect(path, check_same_thread=False),
+        table_format='{table}'
+    )
+    yield path
+    sqlserver.configure(connect=connect, table_format=table_format)
@@ -0,0 +1,95 @@
+"""Seeded source records and a SQLite stand-in for the MS SQL Server.
+
+The records have the columns of the source tables in the MS SQL Server
+(SPAC2SVR) and are generated from a fixed seed, so that the baseline outputs
+frozen in ``tests/data`` stay valid. ``create_standin()`` writes them to a
+SQLite file with the same table names, which the ``sqlserver`` module can
+query in place of the server through ``sqlserver.configure()``.
+"""
+import random
+import sqlite3
+
+import pandas as pd
+
+YEARS = [2019, 2020]
+
+def _pick(rng, values):
+    """Return a value picked from a list by a random number generator."""
+    return values[int(rng.random() * len(values))]
+
+def make_arrests(n=5000, seed=17):
+    """Return seeded records of the ``AnnualPulls.dbo.Arrests`` table.
+
+    ``EventORI`` values include the Chicago Police Department ("CPD") and
+    values that are not county codes, which are dropped by the CHRI source.
+    """
+    rng = random.Random(seed)
+    oris = ['IL0010000', 'ILCPD0000', 'IL0160100', 'ILXYZ0000', 'IL1020000', 'IL', 'IL12A000', 'IL0990000']
+    return pd.DataFrame({
+        'ArrestYear': [_pick(rng, YEARS) for _ in range(n)],
+        'ArrestAge': [5 + int(rng.random() * 21) for _ in range(n)],
+        'EventORI': [_pick(rng, oris) for _ in range(n)]
+    })
+
+def make_prison_admits(n=1500, seed=18):
+    """Return seeded records of the ``PrisonMain.dbo.PrisonAdmits`` table.
+
+    ``COMCNTY`` values are odd county codes, some of which are out of the
+    range of Illinois counties, and ``SEX`` is missing for some records.
+    """
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'FiscalYr': [_pick(rng, YEARS) for _ in range(n)],
+        'COMCNTY': [1 + 2 * int(rng.random() * 104) for _ in range(n)],
+        'SEX': [_pick(rng, ['M', 'M', 'F', None]) for _ in range(n)],
+        'ADMTYPO3': [1 + int(rng.random() * 3) for _ in range(n)],
+        'OFFTYPE': [1 + int(rng.random() * 7) for _ in range(n)],
+        'OFFTYPE3': [1 + int(rng.random() * 3) for _ in range(n)]
+    })
+
+def make_idjj(n=1500, seed=19, exit=False):
+    """Return seeded records of the ``PrisonMain.dbo.IDJJ_Admissions`` or ``IDJJ_exits`` table.
+
+    Ages cover both age groups of the IDJJ indicators and some out of
+    them, and ``County`` values include some out of the range of Illinois
+    counties. The age column of exits is ``ExitAge``.
+    """
+    rng = random.Random(seed)
+    admtypos = ['CE', 'CER', 'DR', 'IC', 'MVN', 'PVN', 'RAM', 'TMV', 'TPV', 'OTH']
+    return pd.DataFrame({
+        'ExitAge' if exit else 'Age': [10 + int(rng.random() * 13) for _ in range(n)],
+        'SFY': [_pick(rng, YEARS) for _ in range(n)],
+        'County': [1 + int(rng.random() * 105) for _ in range(n)],
+        'sex': [_pick(rng, ['M', 'M', 'F', None]) for _ in range(n)],
+        'race': [_pick(rng, ['WHI', 'BLK', 'HSP', 'ASN']) for _ in range(n)],
+        'admtypo': [_pick(rng, admtypos) for _ in range(n)],
+        'OFFTYPE9': [1 + int(rng.random() * 7) for _ in range(n)],
+        'hclass': [_pick(rng, ['M', 'X', '1', '2', 'A', 'B', None]) for _ in range(n)]
+    })
+
+def lowercase(df):
+    """Return a copy of records with lowercased column names, as returned by ``simplecount``."""
+    out = df.copy()
+    out.columns = [c.lower() for c in out.columns]
+    return out
+
+def create_standin(path):
+    """Write the seeded records of every source table to a SQLite file.
+
+    Args:
+        path (str): Path of the SQLite file.
+    """
+    tables = {
+        'Arrests': make_arrests(),
+        'PrisonAdmits': make_prison_admits(),
+        'IDJJ_Admissions': make_idjj(),
+        'IDJJ_exits': make_idjj(seed=20, exit=True)
+    }
+
+    conn = sqlite3.connect(path)
+    try:
+        for name, df in tables.items():
+            df.to_sql(name, conn, index=False, if_exists='replace')
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,102 @@
+"""Tests of counting source records by declarative indicator rules."""
+import pandas as pd
+import pytest
+
+import standin
+
+from webdatatools import rules
+
+def make_records():
+    """Return a few raw records with year and county columns."""
+    return pd.DataFrame({
+        'year': [2019, 2019, 2019, 2020, 2020, 2020],
+        'fk_simplecount_county': [1, 1, 2, 1, 2, 2],
+        'sex': ['M', 'F', 'M', None, 'M', 'F'],
+        'age': [13, 17, 15, 16, 21, 14],
+        'type': ['A', 'B', 'C', 'A', 'A', 'B']
+    }, index=[10, 11, 12, 13, 14, 15])
+
+def count_separately(df, rule_list):
+    """Count the records matched by each rule with a separate group-by, as the replaced transforms did."""
+    g = ['fk_simplecount_indicator', 'year', 'fk_simplecount_county']
+    out = []
+    for ind_id, predicate in rule_list:
+        mask = pd.Series(True, index=df.index)
+        for column, condition in predicate.items():
+            negate = isinstance(condition, rules.Not)
+            condition = condition.condition if negate else condition
+            if isinstance(condition, (list, tuple, set, range)):
+                matched = df[column].isin(list(condition))
+            else:
+                matched = df[column] == condition
+            mask = mask & (~matched if negate else matched)
+        out.append(df[mask].assign(fk_simplecount_indicator=ind_id).groupby(g).size().reset_index(name='value'))
+    return pd.concat(out, ignore_index=True)[['fk_simplecount_indicator', 'fk_simplecount_county', 'year', 'value']]
+
+def test_evaluate_rules_conditions():
+    df = make_records()
+    matrix = rules.evaluate_rules(df, [
+        (1, {'sex': 'M'}),
+        (2, {'sex': rules.Not('M')}),
+        (3, {'age': range(13, 16+1)}),
+        (4, {'type': ['A', 'B'], 'age': rules.Not(range(13, 16+1))}),
+        (5, {})
+    ])
+
+    assert matrix.index.tolist() == df.index.tolist()
+    assert matrix.columns.tolist() == [1, 2, 3, 4, 5]
+    assert matrix[1].tolist() == [True, False, True, False, True, False]
+    assert matrix[2].tolist() == [False, True, False, True, False, True]
+    assert matrix[3].tolist() == [True, False, True, True, False, True]
+    assert matrix[4].tolist() == [False, True, False, False, True, False]
+    assert matrix[5].all()
+
+def test_evaluate_rules_rejects_duplicate_indicators():
+    with pytest.raises(ValueError):
+        rules.evaluate_rules(make_records(), [(1, {'sex': 'M'}), (1, {'sex': 'F'})])
+
+def test_evaluate_rules_evaluates_shared_conditions_once(monkeypatch):
+    calls = []
+    evaluate = rules._evaluate_condition
+
+    def evaluate_and_record(series, condition):
+        calls.append(series.name)
+        return evaluate(series, condition)
+
+    monkeypatch.setattr(rules, '_evaluate_condition', evaluate_and_record)
+
+    rules.evaluate_rules(make_records(), [
+        (1, {'type': ['A', 'B']}),
+        (2, {'type': ['B', 'A'], 'sex': 'M'}),
+        (3, {'type': ('A', 'B'), 'sex': 'M'})
+    ])
+    assert sorted(calls) == ['sex', 'type']
+
+def test_count_by_rules():
+    out = rules.count_by_rules(make_records(), [
+        (2, {'sex': 'M'}),
+        (1, {'type': 'A'}),
+        (3, {'type': 'Z'})
+    ])
+
+    expected = pd.DataFrame({
+        'fk_simplecount_indicator': [1, 1, 1, 2, 2, 2],
+        'fk_simplecount_county': [1, 1, 2, 1, 2, 2],
+        'year': [2019, 2020, 2020, 2019, 2019, 2020],
+        'value': [1, 1, 1, 1, 1, 1]
+    })
+    pd.testing.assert_frame_equal(out, expected)
+
+def test_count_by_rules_matches_separate_counts():
+    df = standin.lowercase(standin.make_idjj())
+    df.columns = ['age', 'year', 'fk_simplecount_county'] + df.columns.tolist()[3:]
+    rule_list = [
+        (1, {'admtypo': ['CE', 'CER'], 'age': range(13, 16+1)}),
+        (2, {'admtypo': ['CE', 'CER'], 'sex': rules.Not('M')}),
+        (3, {'hclass': ['M', 'X', 1, 2], 'race': 'BLK'}),
+        (4, {'hclass': rules.Not(['M', 'X', 1, 2])}),
+        (5, {'offtype9': 9})
+    ]
+
+    expected = count_separately(df, rule_list)
+    pd.testing.assert_frame_equal(rules.count_by_rules(df, rule_list), expected)
@@ -0,0 +1,81 @@
+"""Parity tests of the ``simplecount`` sources fetched from the MS SQL Server.
+
+Sources are fetched from the SQLite stand-in of the ``sql_server`` fixture
+and compared with the outputs of the pandas transforms the current queries
+replaced, frozen in ``tests/data`` for the seeded records of ``standin``.
+Sources read in chunks of rows are also compared with the transform of the
+whole query result in one frame.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+import standin
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def read_baseline(name):
+    """Return a frozen baseline output in ``SimpleCount`` format."""
+    return pd.read_csv(os.path.join(DATA_DIR, f'{name}.csv'))
+
+def select_years(df, years):
+    """Return the rows of the given years with a fresh index."""
+    return df[df['year'].isin(years)].reset_index(drop=True)
+
+def test_query_ms_sql_server_lowercases_columns(simplecount, sql_server):
+    sql = 'SELECT ArrestYear, ArrestAge, EventORI FROM {table} WHERE ArrestYear = ?'
+    out = simplecount._query_ms_sql_server('AnnualPulls', 'Arrests', sql, [2019])
+
+    expected = standin.lowercase(standin.make_arrests())
+    expected = expected[expected['arrestyear'] == 2019].reset_index(drop=True)
+    pd.testing.assert_frame_equal(out, expected)
+
+def test_query_ms_sql_server_raises_if_empty(simplecount, sql_server):
+    sql = 'SELECT ArrestYear FROM {table} WHERE ArrestYear = ?'
+    with pytest.raises(ValueError):
+        simplecount._query_ms_sql_server('AnnualPulls', 'Arrests', sql, [1900])
+
+@pytest.mark.parametrize('year', standin.YEARS)
+def test_fetch_chri_data_matches_baseline(simplecount, sql_server, year):
+    out = simplecount._fetch_chri_data(year)
+    pd.testing.assert_frame_equal(out, select_years(read_baseline('chri'), [year]))
+
+def test_fetch_chri_data_range_matches_baseline(simplecount, sql_server):
+    out = simplecount._fetch_chri_data(standin.YEARS[0], standin.YEARS[-1])
+    pd.testing.assert_frame_equal(out, read_baseline('chri'))
+
+@pytest.fixture
+def small_chunks(simplecount):
+    """Read query results in chunks of a few rows, so that every year spans many chunks."""
+    simplecount._SQL_SERVER_CHUNK_SIZE = 7
+
+def transform_idjj_whole(simplecount):
+    """Return the IDJJ admissions and exits of the stand-in transformed as whole frames."""
+    admit = standin.lowercase(standin.make_idjj())
+    exit = standin.lowercase(standin.make_idjj(seed=20, exit=True))
+    return pd.concat([
+        simplecount._tranform_idjj(admit),
+        simplecount._tranform_idjj(exit, exit=True)
+    ], ignore_index=True)
+
+def test_fetch_idoc_data_matches_whole_frame_transform(simplecount, sql_server, small_chunks):
+    out = simplecount._fetch_idoc_data(standin.YEARS[0], standin.YEARS[-1])
+    whole = simplecount._transform_idoc(standin.lowercase(standin.make_prison_admits()))
+    pd.testing.assert_frame_equal(out, whole.reset_index(drop=True))
+    pd.testing.assert_frame_equal(out, read_baseline('idoc'))
+
+@pytest.mark.parametrize('year', standin.YEARS)
+def test_fetch_idoc_data_matches_baseline(simplecount, sql_server, year):
+    out = simplecount._fetch_idoc_data(year)
+    pd.testing.assert_frame_equal(out, select_years(read_baseline('idoc'), [year]))
+
+def test_fetch_idjj_data_matches_whole_frame_transform(simplecount, sql_server, small_chunks):
+    out = simplecount._fetch_idjj_data(standin.YEARS[0], standin.YEARS[-1])
+    pd.testing.assert_frame_equal(out, transform_idjj_whole(simplecount))
+    pd.testing.assert_frame_equal(out, read_baseline('idjj'))
+
+@pytest.mark.parametrize('year', standin.YEARS)
+def test_fetch_idjj_data_matches_baseline(simplecount, sql_server, year):
+    out = simplecount._fetch_idjj_data(year)
+    pd.testing.assert_frame_equal(out, select_years(read_baseline('idjj'), [year]))
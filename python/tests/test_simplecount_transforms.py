@@ -0,0 +1,56 @@
+"""Parity tests of the IDOC and IDJJ transforms of ``simplecount``.
+
+The transforms count indicators by the rule tables declared in
+``simplecount.init()`` through ``rules.count_by_rules()``. Their outputs for
+the seeded records of ``standin`` are compared with those of the pandas
+transforms they replaced, which counted each indicator with a separate mask
+and group-by, frozen in ``tests/data``.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+import standin
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def read_baseline(name):
+    """Return a frozen baseline output in ``SimpleCount`` format."""
+    return pd.read_csv(os.path.join(DATA_DIR, f'{name}.csv'))
+
+def select_indicators(df, ids):
+    """Return the rows of the given indicators with a fresh index."""
+    return df[df['fk_simplecount_indicator'].isin(ids)].reset_index(drop=True)
+
+def test_transform_idoc_matches_baseline(simplecount):
+    out = simplecount._transform_idoc(standin.lowercase(standin.make_prison_admits()))
+    pd.testing.assert_frame_equal(out.reset_index(drop=True), read_baseline('idoc'))
+
+def test_tranform_idjj_admissions_match_baseline(simplecount):
+    out = simplecount._tranform_idjj(standin.lowercase(standin.make_idjj()))
+    expected = select_indicators(read_baseline('idjj'), range(700, 750))
+    pd.testing.assert_frame_equal(out.reset_index(drop=True), expected)
+
+def test_tranform_idjj_exits_match_baseline(simplecount):
+    out = simplecount._tranform_idjj(standin.lowercase(standin.make_idjj(seed=20, exit=True)), exit=True)
+    expected = select_indicators(read_baseline('idjj'), range(750, 800))
+    pd.testing.assert_frame_equal(out.reset_index(drop=True), expected)
+
+def test_transform_idoc_folds_to_baseline(simplecount):
+    records = standin.lowercase(standin.make_prison_admits())
+    chunks = [records.iloc[i:i+100].copy() for i in range(0, len(records), 100)]
+    out = simplecount._fold_counts(chunks, simplecount._transform_idoc)
+    pd.testing.assert_frame_equal(out, read_baseline('idoc'))
+
+def test_rule_tables_declare_baseline_indicators(simplecount):
+    idoc_ids = [ind_id for ind_id, _ in simplecount._IDOC_RULES]
+    admission_ids = [ind_id for ind_id, _ in simplecount._IDJJ_ADMISSION_RULES]
+    exit_ids = [ind_id for ind_id, _ in simplecount._IDJJ_EXIT_RULES]
+
+    assert idoc_ids == [1600, 1601, 1602, 1603, 1604, 1605, 1606, 1607, 1620, 1621]
+    assert sorted(admission_ids) == list(range(701, 706+1)) + list(range(710, 713+1)) + \
+        list(range(720, 725+1)) + list(range(730, 743+1))
+    assert exit_ids == [ind_id + 50 for ind_id in admission_ids]
+    assert set(read_baseline('idoc')['fk_simplecount_indicator']) == set(idoc_ids)
+    assert set(read_baseline('idjj')['fk_simplecount_indicator']) == set(admission_ids + exit_ids)
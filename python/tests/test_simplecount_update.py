@@ -0,0 +1,30 @@
+"""Tests of fetching multiple ``simplecount`` sources in one update."""
+import pandas as pd
+
+def make_fetched(source, year, county=None, year_to=None):
+    """Return one ``SimpleCount`` row for a source and year, in place of fetching the source."""
+    return pd.DataFrame({
+        'fk_simplecount_indicator': [1], 'fk_simplecount_county': [1], 'year': [year], 'value': [10]
+    })
+
+def test_fetch_all_isolates_failed_year_lookups(simplecount, monkeypatch):
+    conn = simplecount.database.CONN
+    conn.execute('CREATE TABLE Indicator (id INTEGER, fk_indicator_output INTEGER);')
+    conn.execute('CREATE TABLE SimpleCount (fk_simplecount_indicator INTEGER, fk_simplecount_county INTEGER, year INTEGER, value INTEGER);')
+    conn.execute('INSERT INTO Indicator VALUES (1, 9), (2, 10);')
+    conn.execute('INSERT INTO SimpleCount VALUES (1, 1, 2019, 10);')
+    conn.execute('CREATE TABLE County (id INTEGER);')
+    conn.commit()
+
+    staged = []
+    monkeypatch.setattr(simplecount, '_fetch_input_auto', make_fetched)
+    monkeypatch.setattr(simplecount, '_create_temp', staged.append)
+
+    assert simplecount.fetch_all_and_create_temp(['chri', 'idoc', 'idjj'])
+
+    status = simplecount.get_source_status().set_index('source')
+    assert status.loc['chri', 'status'] == 'new rows'
+    assert status.loc['chri', 'year'] == 2020
+    assert status.loc['idoc', 'status'].startswith('failed: ')
+    assert status.loc['idjj', 'status'].startswith('failed: ')
+    assert staged[0]['year'].tolist() == [2020]
@@ -2,21 +2,35 @@
 
 This package provides modules to update and generate datasets to be published
 on ICJIA website with a user-friedly command-line interface. The package
-consists of the following six modules:
+consists of the following eleven modules:
 
 ``database.py``: Offers functions for interacting with the SQL database. 
+``download.py``: Offers functions for downloading source files with
+    a local cache.
 ``inputtools.py``: Offers functions for handling user input.
+``migration.py``: Offers functions for migrating the database schema.
 ``outputtools.py``: Offers functions for generating outputs.
 ``population.py``: Offers functions for automating the processs of
     updating the ``Population`` table in the database.
+``rules.py``: Offers functions for counting source records by declarative
+    indicator rules.
 ``simplecount.py``: Offers functions for automating the process of
     updating the ``SimpleCount`` table in the database.
+``sourcecache.py``: Offers functions for caching transformed source data
+    on the drive.
+``sqlserver.py``: Offers functions for querying the MS SQL Server through
+    pooled connections.
 ``ui.py``: Offers functions for user interface.
 
 """
 from . import database
+from . import download
 from . import inputtools
+from . import migration
 from . import outputtools
 from . import population
+from . import rules
 from . import simplecount
+from . import sourcecache
+from . import sqlserver
 from . import ui
\ No newline at end of file
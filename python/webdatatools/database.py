@@ -6,33 +6,80 @@ modules rather than directly imported by the main program.
 
 The module contains the following public functions to be called externally:
 
-``init()`` establishes connection to a SQLite database, ``@/database/database.db``.
+``init()`` establishes connection to a SQLite database, ``@/database/database.db``,
+    and applies pending schema migrations.
 ``close()`` closes database connection.
 ``commit()`` commits changes to the database.
 ``execute_simple_sql`` runs a simple sequel query without returning any output.
 ``fetch_table()`` fetches a table from the database.
+``fetch_tables()`` fetches tables from the database, reusing cached copies.
+``fetch_snapshot()`` fetches tables from the database within a single transaction.
+``begin_read()`` and ``end_read()`` open and end a transaction for consistent reads.
+``fetch_output_counts()`` fetches ``SimpleCount`` rows for a data output.
+``clear_cache()`` empties the in-process table cache.
+``bulk_load()`` inserts rows to a table in batches within one transaction.
 ``create_temp()``creates a temporary table.
-``add_to_master()``appends a temporary table to the master table.
+``add_to_master()``merges a temporary table into the master table.
+``check_natural_keys()`` lists master tables left with duplicate keys.
+``remove_duplicates()`` removes duplicate records from a master table.
+``refresh_population_rollup()`` refreshes aggregated population by population code.
+``fetch_population_rollup()`` fetches aggregated population for a population code.
+``iter_published_counts()`` and ``iter_population_rollup()`` stream published values for export.
+``hash_output_counts()``, ``hash_population_rollup()`` and ``hash_population_by_year()``
+    return row counts and hashes of the data behind generated outputs.
+``fetch_package_manifest()`` fetches fingerprints of generated packages.
+``update_package_manifest()`` records the fingerprint of a generated package.
 ``delete_temp()`` deletes a temporary table.
 """
+import hashlib
+import itertools
+import json
 import pandas as pd
 import re
 import sqlite3
+import time
+
+from . import migration
+
+_TABLE_CACHE = {}
+_WRITE_COUNT = 0
+_BULK_LOAD_BATCH_SIZE = 50000
+_POPULATION_AGE_RANGES = {
+    1000: (None, None),
+    1001: (60, 85),
+    1002: (0, 16),
+    1003: (0, 17),
+    1004: (10, 16),
+    1005: (13, 16),
+    1006: (0, 18),
+    1007: (10, 12),
+    1008: (10, 17),
+    1009: (17, 20)
+}
 
 def init():
-    """Initialize module and connect to database."""
+    """Initialize module and connect to database.
+
+    The connection may be used from other threads, e.g. by the worker threads
+    generating packages, as long as they do not use it at the same time.
+    """
     global CONN
-    CONN = sqlite3.connect('P:\\DATA\\CJIA_WebData\\database\\database.db')
+    CONN = sqlite3.connect('P:\\DATA\\CJIA_WebData\\database\\database.db', check_same_thread=False)
+    clear_cache()
+    migration.migrate(CONN)
+    _init_population_rollup()
 
 def close():
     """Close database connection."""
     global CONN
     CONN.close()
+    clear_cache()
 
 def commit():
-    """Commit changes."""
+    """Commit changes and mark cached tables as outdated."""
     global CONN
     CONN.commit()
+    _bump_write_count()
 
 def _get_type_sqlite(type_py):
     """Return SQLite data type translated from Python data type."""
@@ -82,24 +129,64 @@ def _create_table(df, name):
     except:
         raise
 
-def _insert_to_table(df, name):
-    """Insert data to an existing table in database.
-        
+def bulk_load(rows, name, columns=None, batch_size=_BULK_LOAD_BATCH_SIZE):
+    """Insert rows to an existing table in database in batches.
+
+    This function streams rows from a pandas DataFrame or any iterable of
+    tuples into a table without materializing them all at once. All batches
+    are inserted with the same prepared statement, which the connection
+    caches, inside one explicit transaction. If a transaction is already
+    open, the rows join it and committing is left to the caller.
+
     Args:
-        df (pandas DataFrame): Data input.
+        rows (pandas DataFrame or iterable): Data input. An iterable must yield
+            tuples in the order of ``columns``.
         name (str): Table name.
+        columns (list): Column names. Required if ``rows`` is not a DataFrame.
+        batch_size (int): Number of rows to insert per batch.
+
+    Returns:
+        int: Number of inserted rows.
     """
     global CONN
+
+    if isinstance(rows, pd.DataFrame):
+        columns = list(rows)
+        rows = rows.itertuples(index=False, name=None)
+    elif columns is None:
+        raise ValueError('ERROR: Column names are required for loading rows from an iterable.')
+
+    params = ', '.join(['?' for i in range(len(columns))])
+    sql = f'INSERT INTO {name} ({", ".join(columns)}) VALUES ({params});'
+
+    own_transaction = not CONN.in_transaction
     
-    columns = ', '.join(list(df))
-    params = ', '.join(['?' for i in range(len(list(df)))])
-    sql = f'INSERT INTO {name} ({columns}) VALUES ({params});'
-   
     try:
+        start = time.perf_counter()
+        if own_transaction:
+            CONN.execute('BEGIN;')
+
         c = CONN.cursor()
-        c.executemany(sql, list(df.itertuples(index=False, name=None)))
+        n = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            c.executemany(sql, batch)
+            n += len(batch)
         c.close()
+
+        if own_transaction:
+            commit()
+        
+        elapsed = time.perf_counter() - start
+        rate = n / elapsed if elapsed > 0 else float(n)
+        print(f'NOTE: {n:,} rows are loaded to "{name}" ({rate:,.0f} rows/sec).')
+        return n
     except:
+        if own_transaction:
+            CONN.rollback()
         sql_to_print = sql if len(sql) < 100 else f'{sql[:80]}...(omitted)...{sql[-10:]}'
         print(f'ERROR: Failed SQL query attempt: "{sql_to_print}"')
         raise
@@ -113,7 +200,7 @@ def _create_and_insert_to_table(df, name):
     """
     try:
         _create_table(df, name)
-        _insert_to_table(df, name)
+        bulk_load(df, name)
     except:
         raise
 
@@ -135,13 +222,44 @@ def fetch_table(name):
         print(f'ERROR: Failed SQL query attempt: "{sql}"')
         raise
 
+def _bump_write_count():
+    """Mark all cached tables as outdated after a write to database."""
+    global _WRITE_COUNT
+    _WRITE_COUNT += 1
+
+def get_data_version():
+    """Return a value that changes whenever the database content may have changed.
+
+    The value combines SQLite's ``PRAGMA data_version``, which changes when
+    another connection commits to the database file, with a counter bumped
+    by the writing functions of this module.
+
+    Returns:
+        tuple: (data_version, write_count).
+    """
+    global CONN
+
+    try:
+        c = CONN.cursor()
+        data_version = c.execute('PRAGMA data_version;').fetchone()[0]
+        c.close()
+        return (data_version, _WRITE_COUNT)
+    except:
+        print('ERROR: Failed SQL query attempt: "PRAGMA data_version;"')
+        raise
+
+def clear_cache():
+    """Empty the in-process table cache."""
+    _TABLE_CACHE.clear()
+
 def fetch_tables(name_list=None):
     """Return a list of tables with the given names fetched from database, each as a pandas.DataFrame.
 
     This function returns a list of tables fetched from database.
-    For efficiency, if a table already exists in the environment as an object,
-    the function simply uses the existing object instead of fetching the table
-    anew from the database.
+    For efficiency, each table is kept in an in-process cache keyed by its
+    name and reused as long as the database has not been written to since
+    it was fetched (see ``get_data_version()``). The returned objects are
+    shared with the cache and must not be modified in place.
     
     Args:
         name_list (list): List of table names to fetch.
@@ -150,17 +268,6 @@ def fetch_tables(name_list=None):
         list: List of pandas.DataFrame objects of tables from database.
     """
     try:
-        name_dict = {
-            'County': 'county',
-            'CombinedCounty': 'combined_county',
-            'Indicator': 'indicator',
-            'Population': 'population',
-            'PopulationOld': 'population_old',
-            'SimpleCount': 'simplecount',
-            'Output': 'output',
-            'Package': 'package'
-        }
-
         if name_list == None:
             name_list = [
                 'County',
@@ -173,19 +280,90 @@ def fetch_tables(name_list=None):
                 'Package'
             ]
         
+        version = get_data_version()
         table_list = []
         for name in name_list:
-            varname = name_dict[name]
-            if varname in locals():
-                table_list.append(locals()[varname])
-            elif varname in globals():
-                table_list.append(globals()[varname])
-            else:
-                table_list.append(fetch_table(name))
+            cached = _TABLE_CACHE.get(name)
+            if cached is None or cached[0] != version:
+                cached = (version, fetch_table(name))
+                _TABLE_CACHE[name] = cached
+            table_list.append(cached[1])
         return table_list
     except:
         raise
 
+def fetch_snapshot(name_list=None):
+    """Return a list of tables fetched from database within a single read transaction.
+
+    Unlike calling ``fetch_tables()`` table by table, this function reads all
+    the tables while holding one transaction so that a concurrent writer
+    cannot commit between two reads and leave the list half-updated.
+
+    Args:
+        name_list (list): List of table names to fetch.
+
+    Returns:
+        list: List of pandas.DataFrame objects of tables from database.
+    """
+    global CONN
+
+    try:
+        if CONN.in_transaction:
+            return fetch_tables(name_list)
+
+        CONN.execute('BEGIN;')
+        try:
+            return fetch_tables(name_list)
+        finally:
+            CONN.rollback()
+    except:
+        raise
+
+def begin_read():
+    """Open a transaction for consistent reads unless one is already open.
+
+    Returns:
+        bool: True if a transaction was opened and must be ended with ``end_read()``.
+    """
+    global CONN
+
+    if CONN.in_transaction:
+        return False
+    CONN.execute('BEGIN;')
+    return True
+
+def end_read():
+    """End a transaction opened by ``begin_read()``."""
+    global CONN
+    CONN.commit()
+
+def fetch_output_counts(out_id):
+    """Return ``SimpleCount`` rows for a specific data output merged with ``County``.
+
+    Only the rows the output needs are read: the query joins ``SimpleCount``
+    to ``Indicator`` on the output id and to ``County`` on the county id, and
+    keeps counties 0 to 102.
+
+    Args:
+        out_id (int): Output ID as in the ``Output`` table in database.
+
+    Returns:
+        pandas.DataFrame: ``year``, ``value`` and indicator ``name`` columns
+            followed by all ``County`` columns.
+    """
+    global CONN
+    sql = 'SELECT s.year, s.value, i.name, c.* ' +\
+        'FROM SimpleCount AS s ' +\
+        'JOIN Indicator AS i ON s.fk_simplecount_indicator = i.id ' +\
+        'LEFT JOIN County AS c ON s.fk_simplecount_county = c.id ' +\
+        'WHERE i.fk_indicator_output = ? AND s.fk_simplecount_county BETWEEN 0 AND 102;'
+
+    try:
+        return pd.read_sql(sql, CONN, params=[int(out_id)])
+    except:
+        print(f'ERROR: Failed SQL query attempt: "{sql[:80]}...(omitted)...{sql[-10:]}"')
+        raise
+
 def _append_to_another_table(name_from, name_to):
     """Append one table to another table."""
     try:
@@ -257,14 +435,124 @@ def create_temp(df, name_temp):
     except:
         raise ValueError(f'ERROR: Cannot create a temporary table with the given name: {name_temp}.')
     
-def add_to_master(name_temp, name_master):
-    """Append data in a temporary table to an existing `master` table.
+def _get_column_names(name):
+    """Return a list of column names of a table in database."""
+    global CONN
+    sql = f'PRAGMA table_info({name});'
+
+    try:
+        c = CONN.cursor()
+        columns = [i[1] for i in c.execute(sql).fetchall()]
+        c.close()
+        return columns
+    except:
+        print(f'ERROR: Failed SQL query attempt: "{sql}"')
+        raise
+
+def _count_merge_result(name_temp, name_master, keys, values):
+    """Return numbers of temporary records to be inserted, updated and left unchanged in the master table."""
+    global CONN
+
+    on = ' AND '.join([f't.{k} = m.{k}' for k in keys])
+    same = ' AND '.join([f't.{v} IS m.{v}' for v in values]) if values else '1'
+    sql = f'SELECT ' +\
+        f'TOTAL(m.rowid IS NULL), ' +\
+        f'TOTAL(m.rowid IS NOT NULL AND NOT ({same})), ' +\
+        f'TOTAL(m.rowid IS NOT NULL AND ({same})) ' +\
+        f'FROM {name_temp} AS t LEFT JOIN {name_master} AS m ON {on};'
+
+    try:
+        c = CONN.cursor()
+        counts = c.execute(sql).fetchone()
+        c.close()
+        return dict(zip(['inserted', 'updated', 'unchanged'], [int(i) for i in counts]))
+    except:
+        sql_to_print = sql if len(sql) < 100 else f'{sql[:80]}...(omitted)...{sql[-10:]}'
+        print(f'ERROR: Failed SQL query attempt: "{sql_to_print}"')
+        raise
+
+def _check_duplicate_keys(name, keys):
+    """Raise an error if records of a table share the same values of the given key columns."""
+    global CONN
+
+    cols = ', '.join(keys)
+    sql = f'SELECT {cols}, COUNT(*) FROM {name} GROUP BY {cols} HAVING COUNT(*) > 1 ORDER BY {cols};'
+
+    try:
+        c = CONN.cursor()
+        duplicates = c.execute(sql).fetchall()
+        c.close()
+    except:
+        print(f'ERROR: Failed SQL query attempt: "{sql}"')
+        raise
+
+    if len(duplicates) > 0:
+        print(f'ERROR: "{name}" has {len(duplicates)} duplicate keys ({cols}):')
+        for row in duplicates[:20]:
+            print(f'    {row[:-1]} in {row[-1]} records')
+        if len(duplicates) > 20:
+            print(f'    ...and {len(duplicates) - 20} more keys')
+        raise ValueError(f'ERROR: "{name}" has duplicate keys and cannot be merged.')
+
+def _merge_to_another_table(name_from, name_to, keys):
+    """Upsert one table into another table on the given key columns.
+
+    Args:
+        name_from (str): Name of the table to read records from.
+        name_to (str): Name of the table to upsert records into.
+        keys (list): Key column names with a unique index in ``name_to``.
+
+    Returns:
+        dict: Numbers of records inserted, updated and unchanged. If
+            ``name_from`` has duplicate keys, ``ValueError`` is thrown
+            before anything is merged.
+    """
+    columns = _get_column_names(name_to)
+    values = [c for c in columns if c not in keys]
+    cols = ', '.join(columns)
+
+    if values:
+        update_set = ', '.join([f'{v} = excluded.{v}' for v in values])
+        update_where = ' OR '.join([f'{name_to}.{v} IS NOT excluded.{v}' for v in values])
+        on_conflict = f'DO UPDATE SET {update_set} WHERE {update_where}'
+    else:
+        on_conflict = 'DO NOTHING'
+
+    try:
+        _check_duplicate_keys(name_from, keys)
+        counts = _count_merge_result(name_from, name_to, keys, values)
+        execute_simple_sql(
+            f'INSERT INTO {name_to} ({cols}) SELECT {cols} FROM {name_from} WHERE true ' +\
+            f'ON CONFLICT ({", ".join(keys)}) {on_conflict};'
+        )
+        return counts
+    except:
+        raise
+
+def add_to_master(name_temp, name_master, autocommit=True):
+    """Merge data in a temporary table into an existing `master` table.
+
+    For master tables with a natural key (``migration.NATURAL_KEYS``), records
+    are upserted: new keys are inserted and existing keys are updated only if
+    their values differ, so repeating an update does not duplicate records.
+    A temporary table with duplicate keys is rejected as a whole, since it is
+    ambiguous which of its records should be kept, and so is a master table
+    whose natural key is not enforced yet because of its own duplicate keys
+    (see ``remove_duplicates()``). Other master tables are simply appended to.
 
     Args:
         name_temp (str): Name of the temporary table.
         name_master (str): Name of the master table.
+        autocommit (bool): If False, changes are left uncommitted for the
+            caller to commit or roll back with other changes.
+
+    Returns:
+        dict: Numbers of records inserted, updated and unchanged, or None if
+            nothing was added.
     
     """
+    global CONN
+
     try:
         table_names = _get_table_names()
         if name_temp not in table_names:
@@ -274,9 +562,63 @@ def add_to_master(name_temp, name_master):
         else:
             if name_temp != f'Temp{name_master}':
                 print('ERROR: Mismatch between temporary and master tables.')
+            elif name_master in migration.NATURAL_KEYS:
+                if not migration.has_natural_key(CONN, name_master):
+                    raise ValueError(
+                        f'ERROR: "{name_master}" has duplicate keys and cannot be updated.' +\
+                        ' Remove the duplicate records from the main menu first.'
+                    )
+                try:
+                    counts = _merge_to_another_table(name_temp, name_master, migration.NATURAL_KEYS[name_master])
+                    if autocommit:
+                        commit()
+                except:
+                    if autocommit:
+                        CONN.rollback()
+                    raise
+                print(f'NOTE: "{name_master}" is successfully updated: ' +\
+                    f'{counts["inserted"]} inserted, {counts["updated"]} updated, ' +\
+                    f'{counts["unchanged"]} unchanged.')
+                return counts
             else:
                 _append_to_another_table(name_temp, name_master)
-                commit()
+                if autocommit:
+                    commit()
+    except:
+        raise
+
+def check_natural_keys():
+    """Print the duplicate keys of master tables whose natural key is not enforced.
+
+    Returns:
+        list: Names of the master tables that cannot be updated until
+            ``remove_duplicates()`` is run.
+    """
+    global CONN
+
+    try:
+        return migration.check_natural_keys(CONN)
+    except:
+        raise
+
+def remove_duplicates(name_master):
+    """Remove records with duplicate natural keys from a master table and enforce its key.
+
+    For each duplicate key, the most recently inserted record is kept and the
+    others are moved to a backup table, e.g. ``SimpleCountDuplicates``.
+
+    Args:
+        name_master (str): Name of the master table.
+
+    Returns:
+        int: Number of records removed.
+    """
+    global CONN
+
+    try:
+        removed = migration.remove_duplicates(CONN, name_master)
+        _bump_write_count()
+        return removed
     except:
         raise
 
@@ -305,36 +647,358 @@ def delete_temp(name_temp=None):
     except:
         raise
     
-def update_output_years(pop=False):
-    """Update year columns in Output table based on the current records."""
+def update_output_years(pop=False, out_id_list=None):
+    """Update year columns in Output table based on the current records.
+
+    The minimum and maximum years are computed in a single grouped aggregate
+    over ``SimpleCount`` joined through ``Indicator`` (or over ``Population``
+    for the population output) and written with a single UPDATE statement
+    in one transaction. Outputs without any records are left unchanged.
+
+    Args:
+        pop (bool): Update the population output from ``Population`` if True,
+            outputs based on ``SimpleCount`` otherwise.
+        out_id_list (list): Output IDs to update. If None, all outputs are updated.
+    """
+    global CONN
+
+    if pop:
+        sql = (
+            'UPDATE Output SET '
+            'year_min = (SELECT MIN(year) FROM Population), '
+            'year_max = (SELECT MAX(year) FROM Population) '
+            'WHERE id = 25;'
+        )
+        params = []
+    else:
+        condition = ''
+        params = []
+        if out_id_list is not None:
+            params = [int(i) for i in out_id_list]
+            condition = f'WHERE i.fk_indicator_output IN ({", ".join(["?"] * len(params))}) '
+        sql = (
+            'UPDATE Output SET year_min = agg.year_min, year_max = agg.year_max '
+            'FROM ('
+            'SELECT i.fk_indicator_output AS out_id, MIN(s.year) AS year_min, MAX(s.year) AS year_max '
+            'FROM SimpleCount AS s '
+            'JOIN Indicator AS i ON s.fk_simplecount_indicator = i.id '
+            f'{condition}'
+            'GROUP BY i.fk_indicator_output'
+            ') AS agg '
+            'WHERE Output.id = agg.out_id;'
+        )
+
     try:
-        output = fetch_tables(['Output'])[0]
-        data = output.copy()
-        
-        def helper(year, id):
-            year_min = year.min()
-            year_max = year.max()
+        if out_id_list is not None and len(out_id_list) == 0:
+            print('NOTE: No year values to update.')
+            return
 
-            data.loc[data['id'] == id, 'year_min'] = year_min
-            data.loc[data['id'] == id, 'year_max'] = year_max
-        
-        if pop:
-            year = fetch_tables(["Population"])[0]['year']
-            helper(year, 25)
-        else:
-            id_list = data['id'].unique().tolist()
-            indicator, simplecount = fetch_tables(['Indicator', 'SimpleCount'])
-            for id in id_list:
-                ind_list = indicator.loc[indicator['fk_indicator_output'] == id, 'id'].tolist()
-                year = simplecount.loc[simplecount['fk_simplecount_indicator'].isin(ind_list), 'year']
-                helper(year, id)
-
-        _delete_table("Output")
-        _create_and_insert_to_table(data, "Output")
+        c = CONN.cursor()
+        c.execute(sql, params)
+        c.close()
         commit()
 
         print('NOTE: Year values are successfully updated.')
     except:
+        CONN.rollback()
+        sql_to_print = sql if len(sql) < 100 else f'{sql[:80]}...(omitted)...{sql[-10:]}'
+        print(f'ERROR: Failed SQL query attempt: "{sql_to_print}"')
         raise
-    
 
+def refresh_population_rollup(year_min=None, year_max=None, autocommit=True):
+    """Refresh the ``PopulationRollup`` table for the given range of years.
+
+    ``PopulationRollup`` holds population values by year and county for every
+    population code: the ``Population`` table aggregated over the age range
+    of each code (``_POPULATION_AGE_RANGES``), together with the matching
+    ``PopulationOld`` records before 2000. Rows for the given years are
+    replaced in one transaction.
+
+    Args:
+        year_min (int): First year to refresh. If None, no lower limit is applied.
+        year_max (int): Last year to refresh. If None, no upper limit is applied.
+        autocommit (bool): If False, changes are left uncommitted for the
+            caller to commit or roll back with other changes.
+    """
+    global CONN
+
+    codes = ', '.join([
+        f'({code}, {"NULL" if age_min is None else age_min}, {"NULL" if age_max is None else age_max})'
+        for code, (age_min, age_max) in _POPULATION_AGE_RANGES.items()
+    ])
+    year_min = -1 if year_min is None else int(year_min)
+    year_max = 9999 if year_max is None else int(year_max)
+
+    sql_delete = 'DELETE FROM PopulationRollup WHERE year BETWEEN ? AND ?;'
+    sql_insert = f'WITH codes(population_code, age_min, age_max) AS (VALUES {codes}) ' +\
+        'INSERT INTO PopulationRollup (year, fk_population_county, population_code, population) ' +\
+        'SELECT p.year, p.fk_population_county, codes.population_code, SUM(p.value) ' +\
+        'FROM Population AS p JOIN codes ' +\
+        'ON codes.age_min IS NULL OR p.age BETWEEN codes.age_min AND codes.age_max ' +\
+        'WHERE p.year BETWEEN ? AND ? ' +\
+        'GROUP BY codes.population_code, p.year, p.fk_population_county ' +\
+        'UNION ALL ' +\
+        'SELECT o.year, o.fk_population_county, o.fk_population_indicator, o.value ' +\
+        'FROM PopulationOld AS o JOIN codes ON o.fk_population_indicator = codes.population_code ' +\
+        'WHERE o.year < 2000 AND o.fk_population_county < 103 AND o.year BETWEEN ? AND ?;'
+
+    try:
+        c = CONN.cursor()
+        c.execute(sql_delete, [year_min, year_max])
+        c.execute(sql_insert, [year_min, year_max, year_min, year_max])
+        c.close()
+        if autocommit:
+            commit()
+        print('NOTE: Population rollup is successfully refreshed.')
+    except:
+        if autocommit:
+            CONN.rollback()
+        print(f'ERROR: Failed SQL query attempt: "{sql_insert[:80]}...(omitted)...{sql_insert[-10:]}"')
+        raise
+
+def _init_population_rollup():
+    """Fill the ``PopulationRollup`` table if it is empty but ``Population`` is not."""
+    global CONN
+
+    try:
+        table_names = _get_table_names()
+        if not all([i in table_names for i in ['Population', 'PopulationOld', 'PopulationRollup']]):
+            return
+
+        c = CONN.cursor()
+        empty = c.execute('SELECT 1 FROM PopulationRollup LIMIT 1;').fetchone() is None
+        populated = c.execute('SELECT 1 FROM Population LIMIT 1;').fetchone() is not None
+        c.close()
+
+        if empty and populated:
+            refresh_population_rollup()
+    except:
+        raise
+
+def fetch_population_rollup(population_code):
+    """Return aggregated population values for a specific population code.
+
+    Args:
+        population_code (int): Code for aggregating population.
+
+    Returns:
+        pandas.DataFrame: Table of population values with columns ``id``
+            (county), ``population`` and ``year``, sorted by year in
+            descending order and then by county.
+    """
+    global CONN
+
+    if population_code not in _POPULATION_AGE_RANGES:
+        raise ValueError('ERROR: Invalid population code!')
+
+    sql = 'SELECT fk_population_county AS id, population, year FROM PopulationRollup ' +\
+        'WHERE population_code = ? ORDER BY year DESC, fk_population_county;'
+
+    try:
+        return pd.read_sql(sql, CONN, params=[int(population_code)])
+    except:
+        print(f'ERROR: Failed SQL query attempt: "{sql}"')
+        raise
+
+def _iter_query(sql, params=()):
+    """Yield rows of the results of a query, fetching them in batches."""
+    global CONN
+    c = CONN.cursor()
+
+    try:
+        c.execute(sql, params)
+        while True:
+            rows = c.fetchmany(_BULK_LOAD_BATCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    except:
+        print(f'ERROR: Failed SQL query attempt: "{sql[:80]}...(omitted)...{sql[-10:]}"')
+        raise
+    finally:
+        c.close()
+
+def _fetch_hash(sql, params=()):
+    """Return the row count and SHA-256 hash of the results of a query.
+
+    Rows are streamed from the cursor rather than loaded at once, so the
+    query should have an ``ORDER BY`` clause for the hash to be stable.
+
+    Args:
+        sql (str): Query to run.
+        params (tuple): Parameters of the query.
+
+    Returns:
+        tuple: Number of rows and hexadecimal digest of the rows.
+    """
+    h = hashlib.sha256()
+    count = 0
+
+    for row in _iter_query(sql, params):
+        h.update(repr(row).encode())
+        count += 1
+    return count, h.hexdigest()
+
+def iter_published_counts(order_by='indicator'):
+    """Yield ``SimpleCount`` values of active data outputs as they are published.
+
+    As in generated packages, only counties 0 to 102 are included and values
+    less than 10 of outputs in source group 2 are masked as None.
+
+    Args:
+        order_by (str): "indicator" to order rows by indicator, year and county,
+            or "county" to order them by county, indicator and year.
+
+    Yields:
+        tuple: Indicator ID, county ID, year and value.
+    """
+    orders = {
+        'indicator': 's.fk_simplecount_indicator, s.year, s.fk_simplecount_county',
+        'county': 's.fk_simplecount_county, s.fk_simplecount_indicator, s.year'
+    }
+    if order_by not in orders:
+        raise ValueError('ERROR: Invalid order! Must be "indicator" or "county".')
+
+    sql = 'SELECT s.fk_simplecount_indicator, s.fk_simplecount_county, s.year, ' +\
+        'CASE WHEN o.source_group = 2 AND s.value < 10 THEN NULL ELSE s.value END ' +\
+        'FROM SimpleCount AS s ' +\
+        'JOIN Indicator AS i ON s.fk_simplecount_indicator = i.id ' +\
+        'JOIN Output AS o ON i.fk_indicator_output = o.id ' +\
+        'WHERE o.active = 1 AND s.fk_simplecount_county BETWEEN 0 AND 102 ' +\
+        f'ORDER BY {orders[order_by]};'
+    yield from _iter_query(sql)
+
+def iter_population_rollup():
+    """Yield aggregated population values ordered by county, population code and year.
+
+    Yields:
+        tuple: County ID, population code, year and population.
+    """
+    sql = 'SELECT fk_population_county, population_code, year, population ' +\
+        'FROM PopulationRollup ORDER BY fk_population_county, population_code, year;'
+    yield from _iter_query(sql)
+
+def hash_output_counts(out_id):
+    """Return the row count and hash of ``SimpleCount`` rows for a specific data output.
+
+    Args:
+        out_id (int): Output ID as in the ``Output`` table in database.
+
+    Returns:
+        tuple: Number of rows and hexadecimal digest of the rows.
+    """
+    sql = 'SELECT s.fk_simplecount_indicator, s.year, s.fk_simplecount_county, s.value ' +\
+        'FROM SimpleCount AS s ' +\
+        'JOIN Indicator AS i ON s.fk_simplecount_indicator = i.id ' +\
+        'WHERE i.fk_indicator_output = ? ' +\
+        'ORDER BY s.fk_simplecount_indicator, s.year, s.fk_simplecount_county;'
+    return _fetch_hash(sql, (int(out_id),))
+
+def hash_population_rollup(population_code):
+    """Return the row count and hash of aggregated population for a population code.
+
+    Args:
+        population_code (int): Code for aggregating population.
+
+    Returns:
+        tuple: Number of rows and hexadecimal digest of the rows.
+    """
+    if population_code not in _POPULATION_AGE_RANGES:
+        raise ValueError('ERROR: Invalid population code!')
+
+    sql = 'SELECT year, fk_population_county, population FROM PopulationRollup ' +\
+        'WHERE population_code = ? ORDER BY year, fk_population_county;'
+    return _fetch_hash(sql, (int(population_code),))
+
+def hash_population_by_year(name):
+    """Return the row count and hash of per-year aggregates of a population table.
+
+    Rather than reading every row, the number of rows and the total value of
+    each year are aggregated in a single query, so only one row per year is
+    hashed. A change to the table is detected if it changes either of them.
+
+    Args:
+        name (str): ``Population`` or ``PopulationOld``.
+
+    Returns:
+        tuple: Number of rows of the table and hexadecimal digest of the aggregates.
+    """
+    if name not in ['Population', 'PopulationOld']:
+        raise ValueError('ERROR: Invalid population table name!')
+
+    sql = f'SELECT year, COUNT(*), SUM(value) FROM {name} GROUP BY year ORDER BY year;'
+    h = hashlib.sha256()
+    count = 0
+
+    for row in _iter_query(sql):
+        h.update(repr(row).encode())
+        count += row[1]
+    return count, h.hexdigest()
+
+def fetch_package_manifest():
+    """Return fingerprints of generated packages recorded in ``PackageManifest``.
+
+    Returns:
+        dict: Package IDs mapped to dicts with ``fingerprint``, ``outputs``
+            (output names mapped to their fingerprints), ``package_hash``,
+            ``exports`` (paths of exported files mapped to their hashes)
+            and ``generated`` keys.
+    """
+    global CONN
+    c = CONN.cursor()
+
+    try:
+        rows = c.execute(
+            'SELECT fk_manifest_package, fingerprint, output_fingerprints, package_hash, ' +\
+            'export_hashes, generated FROM PackageManifest;'
+        ).fetchall()
+        return {
+            pkg_id: {
+                'fingerprint': fingerprint,
+                'outputs': json.loads(outputs),
+                'package_hash': package_hash,
+                'exports': json.loads(exports) if exports is not None else {},
+                'generated': generated
+            }
+            for pkg_id, fingerprint, outputs, package_hash, exports, generated in rows
+        }
+    except:
+        raise
+    finally:
+        c.close()
+
+def update_package_manifest(pkg_id, fingerprint, outputs, package_hash, exports=None):
+    """Record the fingerprint of a generated package in ``PackageManifest``.
+
+    The change is committed without invalidating the table cache, since the
+    manifest is not read through ``fetch_tables()``.
+
+    Args:
+        pkg_id (int): Package ID as in the ``Package`` table in database.
+        fingerprint (str): Fingerprint of all inputs of the package.
+        outputs (dict): Output names mapped to the fingerprints of their inputs.
+        package_hash (str): SHA-256 hash of the generated package file.
+        exports (dict): Paths of the files exported in additional formats
+            mapped to their SHA-256 hashes.
+    """
+    global CONN
+    sql = 'INSERT INTO PackageManifest ' +\
+        '(fk_manifest_package, fingerprint, output_fingerprints, package_hash, export_hashes, generated) ' +\
+        "VALUES (?, ?, ?, ?, ?, datetime('now')) " +\
+        'ON CONFLICT(fk_manifest_package) DO UPDATE SET ' +\
+        'fingerprint = excluded.fingerprint, ' +\
+        'output_fingerprints = excluded.output_fingerprints, ' +\
+        'package_hash = excluded.package_hash, ' +\
+        'export_hashes = excluded.export_hashes, ' +\
+        'generated = excluded.generated;'
+
+    try:
+        CONN.execute(sql, (
+            int(pkg_id), fingerprint, json.dumps(outputs, sort_keys=True), package_hash,
+            json.dumps(exports or {}, sort_keys=True)
+        ))
+        CONN.commit()
+    except:
+        CONN.rollback()
+        print(f'ERROR: Cannot update the manifest of dataset package {pkg_id}!')
+        raise
@@ -0,0 +1,276 @@
+"""Offer functions for downloading source files with a local cache.
+
+This module offer functions to download the source files of automatic
+updates, e.g. the Uniform Crime Report spreadsheets, the LAUS and SAIPE
+files and the CDC population estimates. Downloaded files are kept in a cache
+directory keyed by URL, together with their ``ETag`` and ``Last-Modified``
+headers, so that a file is downloaded again only if the server reports that
+it has changed. Within a session, a URL is requested at most once, so that
+retrying a rejected update or fetching several sources together does not
+download anything twice. Failed requests are retried with an exponential
+backoff, and files can also be served from a local mirror directory without
+any request. The module is intended to be used by the ``simplecount`` and
+``population`` modules rather than directly imported by the main program.
+
+The module contains the following public functions to be called externally:
+
+``configure()`` sets the cache and mirror directories and the retry and worker settings.
+``fetch()`` returns the content of a URL.
+``fetch_many()`` returns the contents of multiple URLs downloaded concurrently.
+``get_download_stats()`` returns the numbers of files served by each way.
+``clear_cache()`` deletes all cached files.
+"""
+import hashlib
+import json
+import os
+import requests
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.parse import unquote, urlparse
+
+_CACHE_DIR = 'P:\\DATA\\CJIA_WebData\\cache\\download'
+_MIRROR_DIR = None
+_RETRIES = 3
+_BACKOFF = 1.0
+_TIMEOUT = 60
+_WORKERS = 4
+_VALIDATED = set()
+_URL_LOCKS = {}
+_STATS = {'mirror': 0, 'session': 0, 'not_modified': 0, 'downloaded': 0, 'stale': 0, 'retries': 0}
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+def configure(cache_dir=None, mirror_dir=None, retries=None, backoff=None, workers=None):
+    """Set where files are cached and mirrored and how they are downloaded.
+
+    URLs already requested in the session are requested again after this call.
+
+    Args:
+        cache_dir (str): Directory of the download cache. If None, it is not changed.
+        mirror_dir (str): Directory of a local mirror, whose files are served by
+            file name instead of downloading them. An empty string turns the
+            mirror off. If None, it is not changed.
+        retries (int): Number of retries of a failed request. If None, it is not changed.
+        backoff (float): Seconds to wait before the first retry, doubled for each
+            following retry. If None, it is not changed.
+        workers (int): Number of concurrent downloads of ``fetch_many()``. If None,
+            it is not changed.
+    """
+    global _CACHE_DIR
+    global _MIRROR_DIR
+    global _RETRIES
+    global _BACKOFF
+    global _WORKERS
+
+    if cache_dir is not None:
+        _CACHE_DIR = cache_dir
+    if mirror_dir is not None:
+        _MIRROR_DIR = mirror_dir or None
+    if retries is not None:
+        _RETRIES = retries
+    if backoff is not None:
+        _BACKOFF = backoff
+    if workers is not None:
+        _WORKERS = workers
+    with _LOCK:
+        _VALIDATED.clear()
+
+def _get_session():
+    """Return the ``requests`` session of the current thread."""
+    if not hasattr(_LOCAL, 'session'):
+        _LOCAL.session = requests.Session()
+    return _LOCAL.session
+
+def _get_url_lock(url):
+    """Return the lock serializing downloads of a URL."""
+    with _LOCK:
+        return _URL_LOCKS.setdefault(url, threading.Lock())
+
+def _count(key):
+    """Count a file served by a way in the download statistics."""
+    with _LOCK:
+        _STATS[key] += 1
+
+def _get_cache_paths(url):
+    """Return the paths to the cached content and metadata of a URL."""
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    path = os.path.join(_CACHE_DIR, key)
+    return f'{path}.bin', f'{path}.json'
+
+def _read_cache(url):
+    """Return the cached content and metadata of a URL, or (None, None) if not cached."""
+    path_content, path_meta = _get_cache_paths(url)
+    try:
+        with open(path_meta, 'r') as f:
+            meta = json.load(f)
+        with open(path_content, 'rb') as f:
+            content = f.read()
+        return content, meta
+    except (OSError, ValueError):
+        return None, None
+
+def _write_cache(url, content, headers):
+    """Write the content and validators of a URL into the cache."""
+    path_content, path_meta = _get_cache_paths(url)
+    meta = {
+        'url': url,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'downloaded': datetime.now().isoformat(timespec='seconds')
+    }
+
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    with open(f'{path_content}.tmp', 'wb') as f:
+        f.write(content)
+    with open(f'{path_meta}.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(f'{path_content}.tmp', path_content)
+    os.replace(f'{path_meta}.tmp', path_meta)
+
+def _read_mirror(url):
+    """Return the content of a URL from the local mirror, or None if not mirrored."""
+    if _MIRROR_DIR is None:
+        return None
+
+    path = os.path.join(_MIRROR_DIR, os.path.basename(unquote(urlparse(url).path)))
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _request(url, meta, verify):
+    """Request a URL, revalidating the cached copy and retrying failed requests.
+
+    Returns:
+        requests.Response: A response with the status code 200 or 304.
+    """
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    for attempt in range(_RETRIES + 1):
+        try:
+            res = _get_session().get(url, headers=headers, verify=verify, timeout=_TIMEOUT)
+            if res.status_code in [200, 304]:
+                return res
+            elif res.status_code < 500 and res.status_code != 429:
+                raise HTTPError(url, res.status_code, res.reason, res.headers, None)
+            error = HTTPError(url, res.status_code, res.reason, res.headers, None)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt < _RETRIES:
+            _count('retries')
+            wait = _BACKOFF * 2 ** attempt
+            print(f'WARNING: Failed to download {url} ({error}) - Retrying in {wait:g} seconds...')
+            time.sleep(wait)
+
+    raise error
+
+def fetch(url, verify=True):
+    """Return the content of a URL.
+
+    The content is served from the local mirror if it has the file,
+    or from the cache if the URL is already requested in the session or the
+    server reports that the file has not changed. Otherwise, it is downloaded
+    and cached. If the server cannot be reached after retries, a cached copy
+    is served with a warning.
+
+    Args:
+        url (str): URL of the file.
+        verify (bool): False to skip the verification of the server's TLS certificate.
+
+    Returns:
+        bytes: The content of the file. If the server responds with an error,
+            e.g. 404 for a file not published yet, ``urllib.error.HTTPError`` is thrown.
+    """
+    try:
+        content = _read_mirror(url)
+        if content is not None:
+            _count('mirror')
+            return content
+
+        with _get_url_lock(url):
+            content, meta = _read_cache(url)
+            if content is not None and url in _VALIDATED:
+                _count('session')
+                return content
+
+            try:
+                res = _request(url, meta if content is not None else None, verify)
+            except (requests.ConnectionError, requests.Timeout, HTTPError) as e:
+                if content is None or (isinstance(e, HTTPError) and e.code < 500 and e.code != 429):
+                    raise
+                print(f'WARNING: Using the cached copy of {url} downloaded at {meta["downloaded"]}.')
+                _count('stale')
+                return content
+
+            if res.status_code == 304:
+                _count('not_modified')
+            else:
+                content = res.content
+                _write_cache(url, content, res.headers)
+                _count('downloaded')
+
+            with _LOCK:
+                _VALIDATED.add(url)
+            return content
+    except:
+        raise
+
+def fetch_many(urls, verify=True, return_exceptions=False):
+    """Return the contents of multiple URLs downloaded concurrently.
+
+    Args:
+        urls (list): URLs of the files.
+        verify (bool): False to skip the verification of the servers' TLS certificates.
+        return_exceptions (bool): True to return the error of a failed URL in
+            place of its content, False to throw the first error in the order of ``urls``.
+
+    Returns:
+        list: The contents of the files in the order of ``urls``.
+    """
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(_WORKERS, len(urls)))) as pool:
+            futures = [pool.submit(fetch, url, verify) for url in urls]
+
+        results = []
+        for future in futures:
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(error if error is not None else future.result())
+        return results
+    except:
+        raise
+
+def get_download_stats():
+    """Return the numbers of files served by each way since the start of the session.
+
+    Returns:
+        dict: Numbers of files served from the ``mirror``, from the cache for URLs
+            already requested in the ``session``, from the cache as ``not_modified``
+            by the server, ``downloaded``, and from the cache as ``stale`` copies
+            when the server cannot be reached, and the number of ``retries``.
+    """
+    with _LOCK:
+        return dict(_STATS)
+
+def clear_cache():
+    """Delete all cached files."""
+    try:
+        with _LOCK:
+            _VALIDATED.clear()
+        if os.path.isdir(_CACHE_DIR):
+            for filename in os.listdir(_CACHE_DIR):
+                if filename.endswith(('.bin', '.json', '.tmp')):
+                    os.remove(os.path.join(_CACHE_DIR, filename))
+    except:
+        raise
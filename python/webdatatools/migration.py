@@ -0,0 +1,326 @@
+"""Offer functions for migrating the schema of the SQL database.
+
+This module offer functions to bring the schema of the database file,
+``@/database/database.db``, up to date. Each migration has a version number,
+and the version of the latest migration applied to the database is recorded
+in the database itself using SQLite's ``PRAGMA user_version``. Migrations are
+applied in order, each in its own transaction, so running ``migrate()``
+repeatedly is safe. The module is intended to be used by the ``database``
+module rather than directly imported by the main program.
+
+The module contains the following public functions to be called externally:
+
+``get_schema_version()`` returns the schema version recorded in the database.
+``migrate()`` applies all pending migrations to the database.
+``has_natural_key()`` checks if the natural key of a master table is enforced.
+``check_natural_keys()`` prints duplicate keys of master tables whose natural key is not enforced.
+``remove_duplicates()`` moves records with duplicate natural keys to a backup table
+    and enforces the natural key.
+
+The module also provides ``NATURAL_KEYS``, the columns that uniquely identify
+a record in each master table updated by the program.
+"""
+
+NATURAL_KEYS = {
+    'SimpleCount': ['fk_simplecount_indicator', 'year', 'fk_simplecount_county'],
+    'Population': ['year', 'fk_population_county', 'age', 'race_gender', 'hispanic']
+}
+_SUPERSEDED_INDEXES = {
+    'SimpleCount': ['fk_simplecount_indicator', 'year', 'fk_simplecount_county'],
+    'Population': ['year', 'fk_population_county', 'age']
+}
+
+def _get_table_names(conn):
+    """Return a list of existing table names in database."""
+    c = conn.cursor()
+    names = c.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
+    c.close()
+    return [i[0] for i in names]
+
+def _create_index(conn, table, columns):
+    """Create an index on the given columns of a table if not exists.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Table name.
+        columns (list): List of column names in the order of the index.
+    """
+    name = f'idx_{table.lower()}_{"_".join(columns)}'
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)});')
+
+def _drop_index(conn, table, columns):
+    """Drop an index created by ``_create_index()`` if exists."""
+    name = f'idx_{table.lower()}_{"_".join(columns)}'
+    conn.execute(f'DROP INDEX IF EXISTS {name};')
+
+def _find_duplicates(conn, table, columns):
+    """Return the keys of a table held by more than one record.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Table name.
+        columns (list): List of key column names.
+
+    Returns:
+        list: Tuples of key values followed by the number of records.
+    """
+    cols = ', '.join(columns)
+    c = conn.cursor()
+    duplicates = c.execute(
+        f'SELECT {cols}, COUNT(*) FROM {table} GROUP BY {cols} HAVING COUNT(*) > 1 ORDER BY {cols};'
+    ).fetchall()
+    c.close()
+    return duplicates
+
+def _print_duplicates(table, columns, duplicates):
+    """Print up to 20 duplicate keys returned by ``_find_duplicates()``."""
+    print(f'WARNING: "{table}" has {len(duplicates)} duplicate keys ({", ".join(columns)}):')
+    for row in duplicates[:20]:
+        print(f'    {row[:-1]} in {row[-1]} records')
+    if len(duplicates) > 20:
+        print(f'    ...and {len(duplicates) - 20} more keys')
+
+def _get_key_index_name(table, columns):
+    """Return the name of the unique index serving as the key of a table."""
+    return f'key_{table.lower()}_{"_".join(columns)}'
+
+def _create_key_index(conn, table, columns):
+    """Create a unique index serving as the key of a table if not exists.
+
+    SQLite cannot add a primary key to an existing table without rebuilding
+    it, so a unique index is used instead.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Table name.
+        columns (list): List of key column names.
+    """
+    name = _get_key_index_name(table, columns)
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)});')
+
+def _enforce_natural_key(conn, table):
+    """Create the unique index of the natural key of a master table unless it has duplicate keys.
+
+    The unique key index supersedes the plain index on the same leading
+    columns added in version 1.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of a master table in ``NATURAL_KEYS``.
+
+    Returns:
+        list: Duplicate keys as returned by ``_find_duplicates()``, empty if
+            the natural key is enforced.
+    """
+    columns = NATURAL_KEYS[table]
+    duplicates = _find_duplicates(conn, table, columns)
+    if len(duplicates) == 0:
+        _create_key_index(conn, table, columns)
+        _drop_index(conn, table, _SUPERSEDED_INDEXES[table])
+    return duplicates
+
+def _migrate_v1(conn):
+    """Add keys and indexes for year lookups and per-output filters."""
+    table_names = _get_table_names(conn)
+
+    keys = [
+        ('County', ['id']),
+        ('Indicator', ['id']),
+        ('Output', ['id']),
+        ('Package', ['id'])
+    ]
+    indexes = [
+        ('SimpleCount', ['fk_simplecount_indicator', 'year', 'fk_simplecount_county']),
+        ('Population', ['year', 'fk_population_county', 'age']),
+        ('PopulationOld', ['fk_population_indicator', 'year', 'fk_population_county']),
+        ('Indicator', ['fk_indicator_output']),
+        ('Output', ['fk_output_package'])
+    ]
+
+    for table, columns in keys:
+        if table in table_names:
+            _create_key_index(conn, table, columns)
+    for table, columns in indexes:
+        if table in table_names:
+            _create_index(conn, table, columns)
+    conn.execute('ANALYZE;')
+
+def _migrate_v2(conn):
+    """Enforce natural keys on the master tables updated by the program.
+
+    A master table with duplicate keys left by repeated updates is left
+    without its key, since choosing which record to keep is left to the
+    operator, and cannot be updated until ``remove_duplicates()`` is run.
+    """
+    table_names = _get_table_names(conn)
+
+    for table in NATURAL_KEYS:
+        if table in table_names:
+            duplicates = _enforce_natural_key(conn, table)
+            if len(duplicates) > 0:
+                _print_duplicates(table, NATURAL_KEYS[table], duplicates)
+                print(f'WARNING: "{table}" cannot be updated until its duplicate records are removed.')
+    conn.execute('ANALYZE;')
+
+def _migrate_v3(conn):
+    """Add the ``PopulationRollup`` table of aggregated population by population code.
+
+    The table is filled by ``database.refresh_population_rollup()``.
+    """
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS PopulationRollup (' +\
+        'year INTEGER, ' +\
+        'fk_population_county INTEGER, ' +\
+        'population_code INTEGER, ' +\
+        'population INTEGER);'
+    )
+    _create_index(conn, 'PopulationRollup', ['population_code', 'year', 'fk_population_county'])
+
+def _migrate_v4(conn):
+    """Add the ``PackageManifest`` table of fingerprints of generated packages.
+
+    The table is read and written by ``database.fetch_package_manifest()``
+    and ``database.update_package_manifest()``.
+    """
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS PackageManifest (' +\
+        'fk_manifest_package INTEGER PRIMARY KEY, ' +\
+        'fingerprint TEXT, ' +\
+        'output_fingerprints TEXT, ' +\
+        'package_hash TEXT, ' +\
+        'generated TEXT);'
+    )
+
+def _migrate_v5(conn):
+    """Add the ``export_hashes`` column of hashes of exported files to ``PackageManifest``."""
+    conn.execute('ALTER TABLE PackageManifest ADD COLUMN export_hashes TEXT;')
+
+_MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5)
+]
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+
+    Returns:
+        int: Version of the latest migration applied to the database.
+    """
+    c = conn.cursor()
+    version = c.execute('PRAGMA user_version;').fetchone()[0]
+    c.close()
+    return version
+
+def has_natural_key(conn, table):
+    """Check if the natural key of a master table is enforced by its unique index.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of a master table in ``NATURAL_KEYS``.
+
+    Returns:
+        bool: True if the unique key index exists, False otherwise.
+    """
+    name = _get_key_index_name(table, NATURAL_KEYS[table])
+    c = conn.cursor()
+    found = c.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?;", (name,)).fetchone()
+    c.close()
+    return found is not None
+
+def check_natural_keys(conn):
+    """Print the duplicate keys of master tables whose natural key is not enforced.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+
+    Returns:
+        list: Names of the master tables whose natural key is not enforced.
+    """
+    table_names = _get_table_names(conn)
+    tables = []
+
+    for table, columns in NATURAL_KEYS.items():
+        if table in table_names and not has_natural_key(conn, table):
+            duplicates = _find_duplicates(conn, table, columns)
+            if len(duplicates) > 0:
+                _print_duplicates(table, columns, duplicates)
+            tables.append(table)
+    return tables
+
+def remove_duplicates(conn, table):
+    """Remove records with duplicate natural keys from a master table.
+
+    For each duplicate key, the most recently inserted record is kept and the
+    others are moved to a backup table, e.g. ``SimpleCountDuplicates``, so
+    that they can be restored if the wrong record is kept. The natural key is
+    then enforced in the same transaction.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of a master table in ``NATURAL_KEYS``.
+
+    Returns:
+        int: Number of records removed.
+    """
+    if table not in NATURAL_KEYS:
+        raise ValueError(f'ERROR: "{table}" has no natural key.')
+
+    cols = ', '.join(NATURAL_KEYS[table])
+    backup = f'{table}Duplicates'
+    where = f'rowid NOT IN (SELECT MAX(rowid) FROM {table} GROUP BY {cols})'
+
+    try:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN;')
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {backup} AS SELECT * FROM {table} WHERE false;')
+        conn.execute(f'INSERT INTO {backup} SELECT * FROM {table} WHERE {where};')
+        c = conn.cursor()
+        c.execute(f'DELETE FROM {table} WHERE {where};')
+        removed = c.rowcount
+        c.close()
+        _enforce_natural_key(conn, table)
+        conn.commit()
+        print(f'NOTE: {removed} duplicate records are moved from "{table}" to "{backup}".')
+        return removed
+    except:
+        conn.rollback()
+        print(f'ERROR: Cannot remove duplicate records from "{table}"!')
+        raise
+
+def migrate(conn):
+    """Apply all pending migrations to the database.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+
+    Returns:
+        int: Schema version of the database after migration.
+    """
+    version = get_schema_version(conn)
+
+    for target, migration in _MIGRATIONS:
+        if target <= version:
+            continue
+
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute('BEGIN;')
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {target};')
+            conn.commit()
+            version = target
+            print(f'NOTE: Database schema is successfully migrated to version {target}.')
+        except:
+            conn.rollback()
+            print(f'ERROR: Cannot migrate database schema to version {target}!')
+            raise
+
+    return version
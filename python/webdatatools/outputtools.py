@@ -8,16 +8,48 @@ The module contains the following public functions to be called externally:
 ``init()`` initializes the ``outputtools`` module.
 ``create_temp()`` creates a temporary table in ``@/temp``.
 ``delete_temp()`` deletes temporary tables in ``@/temp``.
-``generate_package()`` generates a packaged dataset in ``@/dataset``.
+``generate_package()`` generates a packaged dataset in ``@/dataset`` if its inputs changed.
+``generate_packages()`` generates multiple dataset packages whose inputs changed,
+    optionally in parallel.
 ``generate_packages_by_source_group()` generates dataset packages for a provided source group.
+``set_export_formats()`` sets additional file formats to export outputs in, globally or per package.
+``get_export_formats()`` returns additional file formats to export the outputs of a package in.
+``export_api()`` exports a static JSON API sharded by indicator and county in ``@/api``.
+``get_population_cache_stats()`` returns hit and miss counts of the population cache.
+``clear_population_cache()`` empties the population cache.
+
+The module also provides the ``GenerationContext`` class, a read-only snapshot
+of the database tables shared by all outputs generated in a single run.
 """
+import gzip
+import hashlib
+import io
+import itertools
+import json
 import math
 import os
+import pandas as pd
 import re
+import threading
 import zipfile
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from . import database
 
+_POPULATION_CACHE = OrderedDict()
+_POPULATION_CACHE_SIZE = 16
+_POPULATION_CACHE_STATS = {'hits': 0, 'misses': 0}
+_POPULATION_CACHE_LOCK = threading.Lock()
+_WORKER_CTX = None
+_MANIFEST_VERSION = 3
+_CSV_CHUNK_SIZE = 100000
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+_EXPORT_FORMATS = []
+_API_DIR = 'P:\\DATA\\CJIA_WebData\\api'
+_PACKAGE_EXPORT_FORMATS = {}
+
 def init():
     """Initialize the ``outputtools`` module.
 
@@ -33,6 +65,7 @@ def init():
     global _CONN
 
     _CONN = database.CONN
+    clear_population_cache()
 
 # functions to handle temporary outputs
 def _create_file(df, dirname, filename):
@@ -119,59 +152,176 @@ def delete_temp(name_temp=None):
         raise
 
 # functions to generate dataset outputs
-def _get_indicator_for_output(indicator, out_id):
-    """Return indicators for a specific data output.
-
-    Args:
-        indicator (pandas.DataFrame): ``Indicator`` table fetched from database.
-        out_id (int): Output ID as in the ``Output`` table in database.
-    
-    Returns:
-        pandas.DataFrame: Rows from ``Indicator`` table relevent to a specific data output.
+class GenerationContext:
+    """Read-only snapshot of the database tables used for generating outputs.
+
+    The snapshot loads ``County``, ``Indicator``, ``Output`` and ``Package``
+    once and precomputes lookups by output id, indicator id and package id.
+    ``SimpleCount`` is not loaded as a whole; rows for each output are queried
+    on demand by ``get_counts()``, and aggregated population by
+    ``get_population()``. ``Population`` and ``PopulationOld`` are only loaded
+    when first accessed.
+    All reads happen within a single read transaction that is held until
+    ``close()`` is called, so that every output in the run is computed from
+    the same, consistent data. One snapshot is meant to be created per
+    generation run, used as a context manager, and passed down explicitly.
+
+    Worker threads share the snapshot and its read transaction; their reads
+    are serialized by a lock, since they go through a single connection.
+    Calling ``preload()`` reads everything the given packages need up front
+    and detaches the snapshot from the database, so that it can be sent to
+    worker processes.
+
+    Attributes:
+        county (pandas.DataFrame): ``County`` table.
+        indicator (pandas.DataFrame): ``Indicator`` table.
+        output (pandas.DataFrame): ``Output`` table.
+        package (pandas.DataFrame): ``Package`` table.
+        population (pandas.DataFrame): ``Population`` table, loaded on first access.
+        population_old (pandas.DataFrame): ``PopulationOld`` table, loaded on first access.
+        version (tuple): Database data version the snapshot was taken at.
     """
-    try:
-        return indicator[indicator['fk_indicator_output'] == out_id]
-    except:
-        print(f'ERROR: No output is available for the provided input (output id {out_id}).')
-        raise
-
-def _get_output_source_group(output, out_id):
-    """Return output source group number for a specific data output."""
-    try:
-        return output[output['id'] == out_id].iloc[0, 1]
-    except:
-        print(f'ERROR: Cannot get output source group for output id {out_id}!')
-        raise
-
-def _filter_simplecount(simplecount, indicator, out_id):
-    """Filter and return SimpleCount rows for a specific data output.
+    _TABLE_NAMES = [
+        'County',
+        'Indicator',
+        'Output',
+        'Package'
+    ]
+
+    def __init__(self):
+        try:
+            self._transaction = database.begin_read()
+            (
+                self.county,
+                self.indicator,
+                self.output,
+                self.package
+            ) = database.fetch_snapshot(self._TABLE_NAMES)
+            self.version = database.get_data_version()
+            self._counts = {}
+            self._populations = {}
+            self._tables = {}
+            self._lock = threading.Lock()
+
+            self._output_by_id = {k: v for k, v in self.output.groupby('id')}
+            self._output_by_package = {k: v for k, v in self.output.groupby('fk_output_package')}
+            self._indicator_by_id = self.indicator.set_index('id', drop=False)
+            self._indicator_by_output = {k: v for k, v in self.indicator.groupby('fk_indicator_output')}
+            self._package_name = dict(zip(self.package['id'], self.package['name']))
+        except:
+            self.close()
+            print('ERROR: Cannot load tables for generating outputs!')
+            raise
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the read transaction held by the snapshot."""
+        if getattr(self, '_transaction', False):
+            database.end_read()
+            self._transaction = False
+
+    def _get_table(self, name):
+        """Return a table not loaded at initialization, fetching it on first access."""
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = database.fetch_tables([name])[0]
+            return self._tables[name]
+
+    @property
+    def population(self):
+        return self._get_table('Population')
+
+    @property
+    def population_old(self):
+        return self._get_table('PopulationOld')
+
+    def get_counts(self, out_id):
+        """Return ``SimpleCount`` rows merged with ``County`` for a specific data output."""
+        if out_id in self._counts:
+            return self._counts[out_id]
+        with self._lock:
+            return database.fetch_output_counts(out_id)
+
+    def get_population(self, population_code):
+        """Return aggregated population values by year and county for a specific population code."""
+        if population_code in self._populations:
+            return self._populations[population_code]
+        with self._lock:
+            return database.fetch_population_rollup(population_code)
+
+    def preload(self, pkg_id_list):
+        """Read everything needed to generate the given packages and detach from the database.
+
+        Args:
+            pkg_id_list (list): Package IDs as in the ``Package`` table in database.
+        """
+        try:
+            out_pkg = self.output[self.output['fk_output_package'].isin(pkg_id_list)]
+            for _, out_row in out_pkg.drop_duplicates('id').iterrows():
+                out_id = out_row['id']
+                if out_row['standard'] == 1 or out_row['name'] == 'employment':
+                    self._counts[out_id] = database.fetch_output_counts(out_id)
+                if out_row['standard'] == 1:
+                    for code in self.get_indicators(out_id)['fk_indicator_population_indicator'].unique():
+                        code_list = [1004, 1008] if code == 1040 else [code]
+                        for c in code_list:
+                            if c not in self._populations:
+                                self._populations[c] = database.fetch_population_rollup(c)
+                elif out_row['name'] == 'illinois_population':
+                    self._get_table('Population')
+                elif out_row['name'] == 'illinois_population_old':
+                    self._get_table('PopulationOld')
+        finally:
+            self.close()
+
+    def get_output(self, out_id):
+        """Return the ``Output`` row for a specific data output as a pandas.Series."""
+        try:
+            return self._output_by_id[out_id].iloc[0]
+        except KeyError:
+            raise ValueError(f'ERROR: No output is available for the provided input (output id {out_id}).')
+
+    def get_indicators(self, out_id):
+        """Return ``Indicator`` rows relevant to a specific data output."""
+        return self._indicator_by_output.get(out_id, self.indicator.iloc[0:0])
+
+    def get_indicator(self, ind_id):
+        """Return the ``Indicator`` row for a specific indicator as a pandas.Series."""
+        try:
+            return self._indicator_by_id.loc[ind_id]
+        except KeyError:
+            raise ValueError(f'ERROR: No indicator is available for the provided input (indicator id {ind_id}).')
+
+    def get_package_outputs(self, pkg_id):
+        """Return ``Output`` rows belonging to a specific dataset package."""
+        return self._output_by_package.get(pkg_id, self.output.iloc[0:0])
+
+    def get_package_name(self, pkg_id):
+        """Return the name of a specific dataset package."""
+        try:
+            return self._package_name[pkg_id]
+        except KeyError:
+            raise ValueError(f'ERROR: No package is available for the provided input (package id {pkg_id}).')
+
+def _format_counts(fetched, out_id):
+    """Format ``SimpleCount`` rows merged with ``County`` for a specific data output.
 
     Args:
-        simplecount (pandas.DataFrame): ``SimpeleCount`` table fetched from database.
-        indicator (pandas.DataFrame): ``Indicator`` table fetched from database.
-        out_id (int): Output ID as in the ``Output`` table in database.
-    
-    Returns:
-        pandas.DataFrame: Filtered ``SimpleCount`` table relevent to a specific data output.
-
-    """
-    try:
-        ind = _get_indicator_for_output(indicator, out_id)
-
-        filter1 = simplecount['fk_simplecount_indicator'].isin(ind['id'].tolist())
-        filter2 = simplecount['fk_simplecount_county'].isin(list(range(103)))
-        return simplecount[filter1 & filter2]
-    except:
-        print(f'ERROR: Failed to filter simplecount for data output id: {out_id}')
-        raise
-
-def _merge_to_filtered(filtered, county, indicator, out_id):
-    """Merge ``County`` and ``SimpleCount`` tables for a specific data output.
-
-    Args:
-        filtered (pandas.DataFrame): Filtered ``SimpeleCount`` table for a specific data output. 
-        county (pandas.DataFrame): ``County`` table fetched from database.
-        indicator (pandas.DataFrame): ``Indicator`` table fetched from database.
+        fetched (pandas.DataFrame): Output of ``database.fetch_output_counts()`` for a specific data output.
         out_id (int): Output ID as in the ``Output`` table in database.
     
     Returns:
@@ -179,34 +329,19 @@ def _merge_to_filtered(filtered, county, indicator, out_id):
 
     """
     try:
-        ind = _get_indicator_for_output(indicator, out_id)
-        county['percent_rural'] = county['percent_rural'].round(1)
-        col_to_drop1 = ['fk_simplecount_indicator', 'id'] 
-        col_to_drop2 = [
-                'fk_simplecount_county',
+        col_to_drop = [
                 'judicial_circuit',
                 'fk_county_geography',
                 'alphabetical_order'
             ]
         
         return (
-            filtered
-            .merge(
-                ind[['id', 'name']],
-                how='left',
-                left_on='fk_simplecount_indicator',
-                right_on='id')
-            .drop(col_to_drop1, axis=1)
-            .merge(
-                county,
-                how='left',
-                left_on='fk_simplecount_county',
-                right_on='id'
-            )
-            .drop(col_to_drop2, axis=1)
+            fetched
+            .assign(percent_rural=fetched['percent_rural'].round(1))
+            .drop(col_to_drop, axis=1)
         )
     except:
-        print('ERROR: Cannot merge additional information to filtered count table!')
+        print(f'ERROR: Cannot merge additional information to count table for data output id: {out_id}')
         raise
 
 def _mask_less_than_10(df):
@@ -246,16 +381,13 @@ def _pivot_merged(merged):
         print('ERROR: Cannot pivot to create a separate column per indicator value!')
         raise
 
-def _get_count(simplecount, county, output, indicator, out_id):
+def _get_count(ctx, out_id):
     """Return count data from ``SimpleCount`` table for a specific data output.
 
     This function ...
 
     Args:
-        simplecount (pandas.DataFrame): ``SimpeleCount`` table fetched from database.
-        county (pandas.DataFrame): ``County`` table fetched from database.
-        output (pandas.DataFrame): ``Output`` table fetched from database.
-        indicator (pandas.DataFrame): ``Indicator`` table fetched from database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
         out_id (int): Output ID as in the ``Output`` table in database.
     
     Returns:
@@ -263,10 +395,9 @@ def _get_count(simplecount, county, output, indicator, out_id):
          
     """
     try:
-        filtered = _filter_simplecount(simplecount, indicator, out_id)
-        merged = _merge_to_filtered(filtered, county, indicator, out_id)
+        merged = _format_counts(ctx.get_counts(out_id), out_id)
         
-        if _get_output_source_group(output, out_id) == 2:
+        if ctx.get_output(out_id)['source_group'] == 2:
             return _pivot_merged(_mask_less_than_10(merged))
         else:
             return _pivot_merged(merged)
@@ -274,134 +405,122 @@ def _get_count(simplecount, county, output, indicator, out_id):
         print(f'ERROR: Cannot get count table for a data output id: {out_id}')
         raise
 
-def _aggregate_population(population, population_code):
-    """Aggregate population values in the ``Population`` table for a specific population code.
+def get_population_cache_stats():
+    """Return hit and miss counts of the population cache as a dict.
+
+    Hits and misses in worker processes are added once their packages are
+    built, but the cached entries stay in the workers, so ``size`` only
+    counts entries cached in this process.
+    """
+    return dict(_POPULATION_CACHE_STATS, size=len(_POPULATION_CACHE))
+
+def _add_population_cache_stats(stats):
+    """Add hit and miss counts of the population cache of a worker process."""
+    with _POPULATION_CACHE_LOCK:
+        _POPULATION_CACHE_STATS['hits'] += stats['hits']
+        _POPULATION_CACHE_STATS['misses'] += stats['misses']
+
+def clear_population_cache():
+    """Empty the population cache and reset its hit and miss counts."""
+    with _POPULATION_CACHE_LOCK:
+        _POPULATION_CACHE.clear()
+        _POPULATION_CACHE_STATS['hits'] = 0
+        _POPULATION_CACHE_STATS['misses'] = 0
+
+def _get_cached_population(ctx, population_code, build):
+    """Return population values for a population code from the cache, building them on a miss.
+
+    Entries are keyed by the population code and the data version of the
+    snapshot, so they are never reused after the database has been written
+    to. The
+    least recently used entry is evicted once the cache holds more than
+    ``_POPULATION_CACHE_SIZE`` entries. Cached tables are shared and must not
+    be modified in place.
 
     Args:
-        population (pandas.DataFrame): ``Population`` table fetched from database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
         population_code (int): Code for aggregating population.
+        build (function): Returns the population values on a cache miss.
     
     Returns:
         pandas.DataFrame: Table of aggregated population values by year and county.
     """
-    try:
-        if population_code == 1000:
-            pop = population
-        elif population_code == 1001:
-            pop = population[population['age'].isin(range(60, 85+1))]
-        elif population_code == 1002:
-            pop = population[population['age'].isin(range(16+1))]
-        elif population_code == 1003:
-            pop = population[population['age'].isin(range(17+1))]
-        elif population_code == 1004:
-            pop = population[population['age'].isin(range(10, 16+1))]
-        elif population_code == 1005:
-            pop = population[population['age'].isin(range(13, 16+1))]
-        elif population_code == 1006:
-            pop = population[population['age'].isin(range(18+1))]
-        elif population_code == 1007:
-            pop = population[population['age'].isin(range(10, 12+1))]
-        elif population_code == 1008:
-            pop = population[population['age'].isin(range(10, 17+1))]
-        elif population_code == 1009:
-            pop = population[population['age'].isin(range(17, 20+1))]    
-        else:
-            raise ValueError('ERROR: Invalid population code!')
-        
-        return (
-            pop
-            .groupby(['year', 'fk_population_county'])
-            .value
-            .agg('sum')
-            .reset_index()
-            .sort_values(by='fk_population_county', kind='mergesort')
-            .sort_values(by='year', ascending=False, kind='mergesort')
-        )
-    except:
-        print('ERROR: Cannot aggregate population!')
-        raise
-
-def _get_population(population, population_old, population_code):
-    """Return population values using the ``Population`` and ``PopulationOld`` tables for a specific population code.
+    key = (population_code, ctx.version)
+    with _POPULATION_CACHE_LOCK:
+        if key in _POPULATION_CACHE:
+            _POPULATION_CACHE.move_to_end(key)
+            _POPULATION_CACHE_STATS['hits'] += 1
+            return _POPULATION_CACHE[key]
+        _POPULATION_CACHE_STATS['misses'] += 1
+
+    pop = build()
+    with _POPULATION_CACHE_LOCK:
+        _POPULATION_CACHE[key] = pop
+        while len(_POPULATION_CACHE) > _POPULATION_CACHE_SIZE:
+            _POPULATION_CACHE.popitem(last=False)
+    return pop
+
+def _get_population(ctx, population_code):
+    """Return population values for a specific population code.
 
     Args:
-        population (pandas.DataFrame): ``Population`` table fetched from database.
-        population_old (pandas.DataFrame): ``PopulationOld`` table fetched from database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
         population_code (int): Code for aggregating population.
     
     Returns:
         pandas.DataFrame: Table of aggregated population values by year and county.
     """
     try:
-        pop_new = _aggregate_population(population, population_code)
-        pop_old = population_old[
-                (population_old['fk_population_indicator'] == population_code) &
-                (population_old['year'] < 2000) &
-                (population_old['fk_population_county'] < 103)] \
-            .drop('fk_population_indicator', axis=1) \
-            .sort_values(by='fk_population_county', kind='mergesort') \
-            .sort_values(by='year', ascending=False, kind='mergesort')
-        
-        pop = pop_new.append(pop_old)
-        pop.columns = ['id', 'population', 'year']
-        
-        return pop.reset_index(drop=True)
+        return _get_cached_population(ctx, population_code, lambda: ctx.get_population(population_code))
     except:
         print(f'ERROR: Cannot get population for population code: {population_code}')
         raise
 
-def _get_juv_population(population, population_old):
-    """Return mixed juvenile population values using the ``Population`` and ``PopulationOld`` tables.
+def _get_juv_population(ctx):
+    """Return mixed juvenile population values.
 
     Args:
-        population (pandas.DataFrame): ``Population`` table fetched from database.
-        population_old (pandas.DataFrame): ``PopulationOld`` table fetched from database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
     
     Returns:
         pandas.DataFrame: Table of aggregated population values by year and county.
     """
-    try:
-        pop_1016 = _get_population(population, population_old, 1004)
-        pop_1017 = _get_population(population, population_old, 1008)
+    def build():
+        pop_1016 = _get_population(ctx, 1004)
+        pop_1017 = _get_population(ctx, 1008)
         
         pop_before = pop_1016[pop_1016['year'] <= 2010]
         pop_after = pop_1017[pop_1017['year'] > 2010]
 
-        return pop_before.append(pop_after).reset_index(drop=True)
+        return pd.concat([pop_before, pop_after]).reset_index(drop=True)
+
+    try:
+        return _get_cached_population(ctx, 1040, build)
     except:
         print('ERROR: Cannot get juvenile population!')
         raise
 
-def _generate_standard_output(out_id):
+def _generate_standard_output(out_id, ctx):
     """Return a processed table for a standard data output.
 
     Args:
         out_id (int): Output ID as in the ``Output`` table in database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
 
     Returns:
         pandas.DataFrame: A specified standard output table with counts and rates.
     """
     try:
-        name_list = [
-            'County',
-            'Indicator',
-            'Population',
-            'PopulationOld',
-            'SimpleCount',
-            'Output'
-        ]
-        county, indicator, population, population_old, simplecount, output = database.fetch_tables(name_list)
-
-        ind = _get_indicator_for_output(indicator, out_id)       
-        count = _get_count(simplecount, county, output, indicator, out_id)
+        ind = ctx.get_indicators(out_id)
+        count = _get_count(ctx, out_id)
         rate_type = ind['fk_indicator_ratedivisor'].iloc[0,]
         pop_code = ind['fk_indicator_population_indicator'].iloc[0,]
         multiplier = 1
 
         if pop_code == 1040:
-            pop = _get_juv_population(population, population_old)
+            pop = _get_juv_population(ctx)
         else:
-            pop = _get_population(population, population_old, pop_code)
+            pop = _get_population(ctx, pop_code)
 
         if rate_type == 1:
             multiplier = 100000
@@ -420,30 +539,21 @@ def _generate_standard_output(out_id):
     except:
         raise
 
-def _generate_nonstandard_output(out_id):
+def _generate_nonstandard_output(out_id, ctx):
     """Return a processed table for a non-standard data output.
 
     Args:
         out_id (int): Output ID as in the ``Output`` table in database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
 
     Returns:
         pandas.DataFrame: A specified non-standard output table.
     """
     try:
-        name_list = [
-            'County',
-            'Indicator',
-            'Population',
-            'PopulationOld',
-            'SimpleCount',
-            'Output'
-        ]
-        county, indicator, population, population_old, simplecount, output = database.fetch_tables(name_list)
-
-        name = output[output['id'] == out_id]['name'].iloc[0]
+        name = ctx.get_output(out_id)['name']
 
         if name == 'employment':
-            out = _get_count(simplecount, county, output, indicator, out_id)
+            out = _get_count(ctx, out_id)
             out['unemployment_rate'] = out['unemployed'] / out['labor_force_population'] * 100
             out['unemployment_rate'] = out['unemployment_rate'].round(1)
             column_list = out.columns.tolist()
@@ -451,13 +561,13 @@ def _generate_nonstandard_output(out_id):
             return out[column_list[:7] + ['labor_force_population', 'employed'] + column_list[9:]]
         elif name in ['illinois_population', 'illinois_population_old']:
             if name == 'illinois_population':
-                pop = population.copy()
+                pop = ctx.population.copy()
                 pop.columns = ['year', 'id', 'age','race_gender', 'hispanic', 'value']
             elif name == 'illinois_population_old':
-                pop = population_old.copy()
+                pop = ctx.population_old.copy()
                 pop.columns = ['id', 'year', 'population_code', 'value']
                                
-            county['percent_rural'] = county['percent_rural'].round(1)
+            county = ctx.county.assign(percent_rural=ctx.county['percent_rural'].round(1))
             column_to_keep = ['year', 'id', 'fips_number', 'county_name'] +\
                 ['region', 'commuity_type', 'percent_rural'] +\
                 pop.columns.tolist()[2:]
@@ -468,7 +578,7 @@ def _generate_nonstandard_output(out_id):
     except:
         raise
 
-def _generate_output(out_id):
+def _generate_output(out_id, ctx):
     """Return a processed table for a specific data output.
 
     This funtion uses values in ``SimpleCount`` or ``Population`` in
@@ -477,58 +587,31 @@ def _generate_output(out_id):
 
     Args:
         out_id (int): Output ID as in the ``Output`` table in database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
 
     Returns:
         pandas.DataFrame: A specified output table.
 
     """
     try:
-        output = database.fetch_tables(['Output'])[0]
-        name = output[output['id'] == out_id]['name'].tolist()[0]
-
-        active = output[output['id'] == out_id]['active'].tolist()[0] == 1
-        standard = output[output['id'] == out_id]['standard'].tolist()[0] == 1
+        out_row = ctx.get_output(out_id)
+        active = out_row['active'] == 1
+        standard = out_row['standard'] == 1
         
         if active:
             if standard:
-                return _generate_standard_output(out_id)
+                return _generate_standard_output(out_id, ctx)
             else:
-                return _generate_nonstandard_output(out_id)
+                return _generate_nonstandard_output(out_id, ctx)
         else:
             raise ValueError(f'ERROR: The specificed output with id {out_id} is currently not active.')
     except:
         raise
 
-def _generate_outputs(pkg_id):
-    """Generate multiple processed data output tables.
-
-    This function takes a list of names and generates all datasets specified by
-    the given names.
-
-    Args:
-        pkg_id (int): A package id for datasets to generate.
-    
-    Return:
-        list: A list of dataset outputs as pandas.DataFrame. 
-
-    """
-    try:
-        output = database.fetch_table('Output')
-        out_id_list = output[output['fk_output_package'] == pkg_id]['id'].unique().tolist()
-        
-        out_list = []
-        for out_id in out_id_list:
-            out_list.append(_generate_output(out_id))
-        
-        return out_list
-    except:
-        raise
-
-def _create_readme(pkg_id):
+def _create_readme(pkg_id, ctx):
     """Return a string of REAMDE text for the specified dataset package."""
     try:
-        output = database.fetch_tables(['Output'])[0]
-        out_pkg = output[output['fk_output_package'] == pkg_id] \
+        out_pkg = ctx.get_package_outputs(pkg_id) \
             .drop(columns=['old_name']) \
             .drop_duplicates() \
             .reset_index(drop=True)
@@ -575,54 +658,607 @@ def _create_readme(pkg_id):
     except:
         raise
 
-def generate_package(pkg_id):
-    """Generate a packaged dataset in ``@/dataset``.
+def _get_zip_info(arcname):
+    """Return a ``ZipInfo`` for a zip entry with a fixed timestamp and attributes.
+
+    Entries written with the same content and name are byte-identical
+    regardless of when and where the zipped file is generated.
+    """
+    info = zipfile.ZipInfo(arcname, date_time=_ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.create_system = 0
+    info.external_attr = 0
+    return info
+
+def _write_csv_to_zip(z, arcname, df):
+    """Write a table as a CSV entry of a zipped file, streaming it in chunks of rows."""
+    with io.TextIOWrapper(z.open(_get_zip_info(arcname), 'w'), encoding='utf-8', newline='') as f:
+        df.to_csv(f, index=False, chunksize=_CSV_CHUNK_SIZE)
+
+def _write_checksum(path):
+    """Write the SHA-256 hash of a file to a ``.sha256`` sidecar file next to it."""
+    with open(f'{path}.sha256', 'w', newline='\n') as f:
+        f.write(f'{_hash_file(path)}  {os.path.basename(path)}\n')
+
+def _write_csv_gz(df, f):
+    """Write a table to a binary file as a gzip-compressed CSV."""
+    with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+        with io.TextIOWrapper(gz, encoding='utf-8', newline='') as t:
+            df.to_csv(t, index=False, chunksize=_CSV_CHUNK_SIZE)
+
+def _write_parquet(df, f):
+    """Write a table to a binary file in the Parquet format using ``pyarrow``."""
+    df.to_parquet(f, index=False, engine='pyarrow')
+
+def _write_json(df, f):
+    """Write a table to a binary file as compact columnar JSON.
+
+    The JSON object has ``columns``, ``dtypes`` and ``data`` keys, where
+    ``data`` holds one list of values per column and missing values are null.
+    """
+    data = []
+    for col in df.columns:
+        values = df[col]
+        data.append(values.astype(object).where(values.notna(), None).tolist())
+
+    obj = {
+        'columns': [str(col) for col in df.columns],
+        'dtypes': [str(dtype) for dtype in df.dtypes],
+        'data': data
+    }
+    f.write(json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+
+_WRITERS = {
+    'csv.gz': _write_csv_gz,
+    'parquet': _write_parquet,
+    'json': _write_json
+}
+
+def _check_export_formats(formats):
+    """Raise an error if a format has no writer or its optional dependency is not installed."""
+    for fmt in formats:
+        if fmt not in _WRITERS:
+            raise ValueError(f'ERROR: Invalid export format "{fmt}"! Must be one of {", ".join(_WRITERS)}.')
+        if fmt == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError('ERROR: Exporting to Parquet requires the "pyarrow" package!')
+
+def set_export_formats(formats, pkg_id=None):
+    """Set additional file formats to export the outputs of packages in.
+
+    Every package is always generated as a zipped file of CSV outputs. Each
+    additional format is written in the same pass over each generated output
+    to ``@/dataset/<package name>/``. Available formats are "csv.gz"
+    (gzip-compressed CSV), "parquet" (requires ``pyarrow``) and "json"
+    (compact columnar JSON).
+
+    Args:
+        formats (list): Additional format names. An empty list exports none.
+        pkg_id (int): Package ID as in the ``Package`` table in database. If
+            None, the formats are set for all packages without their own.
+    """
+    _check_export_formats(formats)
+
+    if pkg_id is None:
+        _EXPORT_FORMATS[:] = list(formats)
+    else:
+        _PACKAGE_EXPORT_FORMATS[pkg_id] = list(formats)
+
+def get_export_formats(pkg_id):
+    """Return additional file formats to export the outputs of a package in."""
+    return list(_PACKAGE_EXPORT_FORMATS.get(pkg_id, _EXPORT_FORMATS))
+
+def _get_export_dir(package_name):
+    """Return the directory of the exported output files of a package."""
+    return f'P:\\DATA\\CJIA_WebData\\datasets\\{package_name}'
+
+def _get_export_path(package_name, filename):
+    """Return the path of an exported output file, creating its package directory if needed."""
+    dirname = _get_export_dir(package_name)
+    os.makedirs(dirname, exist_ok=True)
+    return os.path.join(dirname, filename)
+
+def _get_output_basenames(out_pkg):
+    """Return output IDs of a package mapped to the names of their files without extensions."""
+    max_year = int(out_pkg['year_max'].max())
+    out_id_list = out_pkg['id'].unique().tolist()
+    name_list = out_pkg['name'].unique().tolist()
+    return {out_id_list[i]: f'{max_year}_{name_list[i]}' for i in range(len(out_id_list))}
+
+def _list_export_paths(pkg_id, ctx, formats):
+    """Return the paths of the files a package exports in the given additional formats."""
+    dirname = _get_export_dir(ctx.get_package_name(pkg_id))
+    basenames = _get_output_basenames(ctx.get_package_outputs(pkg_id))
+    return sorted(
+        os.path.join(dirname, f'{basename}.{fmt}')
+        for basename in basenames.values() for fmt in formats
+    )
+
+def _export_output(df, package_name, basename, formats):
+    """Write an output table to a file in each of the given additional formats."""
+    for fmt in formats:
+        with open(_get_export_path(package_name, f'{basename}.{fmt}'), 'wb') as f:
+            _WRITERS[fmt](df, f)
+
+def _get_package_path(package_name):
+    """Return the path of the zipped file of a packaged dataset."""
+    return f'P:\\DATA\\CJIA_WebData\\datasets\\{package_name}.zip'
+
+def _hash_frame(df):
+    """Return the SHA-256 hash of the column names and values of a table."""
+    h = hashlib.sha256(','.join(df.columns).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+def _hash_file(path):
+    """Return the SHA-256 hash of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _fingerprint_output(out_id, ctx):
+    """Return a fingerprint of all inputs of a data output.
+
+    The fingerprint combines the ``Output`` and ``Indicator`` rows of the
+    output with the hashes of its ``SimpleCount`` rows and of the population
+    values it uses, prefixed with their total number of rows. Whole population
+    tables are fingerprinted by their per-year aggregates.
+
+    Args:
+        out_id (int): Output ID as in the ``Output`` table in database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
+
+    Returns:
+        str: Fingerprint in the form of ``<row count>:<hash>``.
+    """
+    try:
+        out_row = ctx.get_output(out_id)
+        indicators = ctx.get_indicators(out_id)
+        parts = [_hash_frame(out_row.to_frame().T.astype(str)), _hash_frame(indicators)]
+        hashes = []
+
+        if out_row['standard'] == 1 or out_row['name'] == 'employment':
+            hashes.append(database.hash_output_counts(out_id))
+
+        if out_row['standard'] == 1:
+            for code in sorted(indicators['fk_indicator_population_indicator'].unique()):
+                code_list = [1004, 1008] if code == 1040 else [code]
+                for c in code_list:
+                    hashes.append(database.hash_population_rollup(c))
+        elif out_row['name'] == 'illinois_population':
+            hashes.append(database.hash_population_by_year('Population'))
+        elif out_row['name'] == 'illinois_population_old':
+            hashes.append(database.hash_population_by_year('PopulationOld'))
+
+        rows = sum([n for n, _ in hashes])
+        parts += [part_hash for _, part_hash in hashes]
+
+        return f'{rows}:{hashlib.sha256("|".join(parts).encode()).hexdigest()}'
+    except:
+        raise
+
+def _plan_package(pkg_id, ctx, manifest, force=False, formats=None):
+    """Fingerprint a package and decide whether it needs to be rebuilt.
+
+    Args:
+        pkg_id (int): Package ID as in the ``Package`` table in database.
+        ctx (GenerationContext): Snapshot of the database tables for the current run.
+        manifest (dict): Fingerprints of generated packages as returned by
+            ``database.fetch_package_manifest()``.
+        force (bool): If True, the package is rebuilt regardless of its fingerprint.
+        formats (list): Additional formats to export the outputs of the package in.
+
+    Returns:
+        dict: ``name``, ``path``, ``fingerprint``, ``outputs`` (output names
+            mapped to their fingerprints) and ``exports`` (paths of the files
+            exported in additional formats) of the package, and ``reason`` for
+            rebuilding it or None if it is unchanged.
+    """
+    try:
+        package_name = ctx.get_package_name(pkg_id)
+        path = _get_package_path(package_name)
+        out_pkg = ctx.get_package_outputs(pkg_id)
+        outputs = {row['name']: _fingerprint_output(row['id'], ctx) for _, row in out_pkg.iterrows()}
+        exports = _list_export_paths(pkg_id, ctx, formats or [])
+        fingerprint = hashlib.sha256(json.dumps({
+            'version': _MANIFEST_VERSION,
+            'package': package_name,
+            'county': _hash_frame(ctx.county),
+            'formats': sorted(formats or []),
+            'outputs': outputs
+        }, sort_keys=True).encode()).hexdigest()
+
+        entry = manifest.get(pkg_id)
+        if force:
+            reason = 'regeneration is forced'
+        elif entry is None:
+            reason = 'no previous build is recorded'
+        elif not os.path.exists(path):
+            reason = 'dataset file is missing'
+        else:
+            changed = sorted(
+                name for name in set(outputs) | set(entry['outputs'])
+                if outputs.get(name) != entry['outputs'].get(name)
+            )
+            if len(changed) > 0:
+                reason = f'inputs changed for {", ".join(changed)}'
+            elif fingerprint != entry['fingerprint']:
+                reason = 'package definition changed'
+            elif _hash_file(path) != entry['package_hash']:
+                reason = 'dataset file was modified'
+            else:
+                reason = None
+                for export in exports:
+                    if not os.path.exists(export):
+                        reason = f'exported file {os.path.basename(export)} is missing'
+                        break
+                    elif _hash_file(export) != entry['exports'].get(export):
+                        reason = f'exported file {os.path.basename(export)} was modified'
+                        break
+
+        return {
+            'name': package_name,
+            'path': path,
+            'fingerprint': fingerprint,
+            'outputs': outputs,
+            'exports': exports,
+            'reason': reason
+        }
+    except:
+        raise
+
+def _build_package(pkg_id, ctx, formats=None):
+    """Generate a packaged dataset in ``@/dataset`` and return its name.
+
+    Outputs are generated and written to the compressed zipped file one at a
+    time, so that peak memory is bounded by the largest output rather than
+    the whole package. Entries are written in the order of their names with
+    fixed timestamps, so that the same data always produces the same bytes,
+    and the SHA-256 hash of the zipped file is written to a ``.sha256``
+    sidecar file. Each output is also exported in
+    the given additional formats before the next one is generated.
+
+    Args:
+        pkg_id (int): Package ID as in the ``Package`` table in database.
+        ctx (GenerationContext): Snapshot of the database tables to generate the package from.
+        formats (list): Additional formats to export the outputs in.
+
+    Returns:
+        str: Name of the generated package.
+    """
+    try:
+        out_pkg = ctx.get_package_outputs(pkg_id)
+        package_name = ctx.get_package_name(pkg_id)
+        basenames = _get_output_basenames(out_pkg)
+        readme_list = _create_readme(pkg_id, ctx)
+
+        entries = [('README.txt', None, readme_list[0])]
+        for i, (out_id, basename) in enumerate(basenames.items()):
+            entries.append((f'{basename}.csv', out_id, None))
+            entries.append((f'metadata_{basename}.txt', None, readme_list[i+1]))
+        
+        path = _get_package_path(package_name)
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+            for arcname, out_id, text in sorted(entries, key=lambda entry: entry[0]):
+                if out_id is not None:
+                    out = _generate_output(out_id, ctx)
+                    _write_csv_to_zip(z, arcname, out)
+                    _export_output(out, package_name, arcname[:-len('.csv')], formats or [])
+                    del out
+                else:
+                    z.writestr(_get_zip_info(arcname), text)
+        _write_checksum(path)
+        
+        print(f'NOTE: Dataset "{package_name}" is successfully generated!')
+        return package_name
+    except:
+        raise
+
+def generate_package(pkg_id, force=False):
+    """Generate a packaged dataset in ``@/dataset`` if its inputs changed.
 
     This function generates a zipped file of a packaged dataset,
     consisting of data outputs in the comma-separated value (CSV) format
     as well as a README text file. Each generated package will be stored
     in ``@/dataset``. If a dataset of the same name already exists,
-    the function will overwrite it.
+    the function will overwrite it, unless the inputs of the package and
+    the existing file are unchanged since it was last generated.
     
     Args:
-        package_name (str): Name of a packaged dataset to generate.
-        out_list (list): List of pandas.DataFrame objects for data files. 
-        name_list (list): List of str for names of data files.
+        pkg_id (int): Package ID as in the ``Package`` table in database.
+        force (bool): If True, the package is generated even if unchanged.
 
-    """
+    Returns:
+        bool: True for success, False otherwise.
 
+    """
     try:
-        output, package = database.fetch_tables(['Output', 'Package'])
-        out_list = _generate_outputs(pkg_id)
-        
-        package_name = package[package['id'] == pkg_id]['name'].tolist()[0]
-        name_list = output[output['fk_output_package'] == pkg_id]['name'].unique().tolist()
-        readme_list = _create_readme(pkg_id)
-        max_year = int(output[output['fk_output_package'] == pkg_id]['year_max'].max())
-        
-        path = f'P:\\DATA\\CJIA_WebData\\datasets\\{package_name}.zip'
-        with zipfile.ZipFile(path, 'w') as z:
-            for i in range(len(out_list)):
-                z.writestr(f'{max_year}_{name_list[i]}.csv', out_list[i].to_csv(index=False))
-                z.writestr(f'metadata_{max_year}_{name_list[i]}.txt', readme_list[i+1])
-            z.writestr('README.txt', readme_list[0])
-        
-        print(f'NOTE: Dataset "{package_name}" is successfully generated!')
-        return True
+        error = generate_packages([pkg_id], force=force)[pkg_id]
+        if error is not None:
+            print(error)
+        return error is None
     except Exception as e:
         print(e)
         return False
 
-def generate_packages_by_source_group(source_group):
-    """Generate dataset packages for a provided source group."""
+def _init_worker(ctx):
+    """Store the snapshot shared by all packages built in a worker process."""
+    global _WORKER_CTX
+    _WORKER_CTX = ctx
+
+def _build_package_in_worker(pkg_id, formats):
+    """Build a package in a worker process using the snapshot given at start-up.
+
+    Returns:
+        dict: Hits and misses of the population cache of the worker while
+            building the package.
+    """
+    before = get_population_cache_stats()
+    _build_package(pkg_id, _WORKER_CTX, formats)
+    after = get_population_cache_stats()
+    return {k: after[k] - before[k] for k in ['hits', 'misses']}
+
+def _build_packages(pkg_id_list, ctx, workers, executor):
+    """Build packages from a snapshot, returning package IDs mapped to raised exceptions or None."""
+    results = {}
+    formats = {pkg_id: get_export_formats(pkg_id) for pkg_id in pkg_id_list}
+
+    if workers is None or workers <= 1:
+        for pkg_id in pkg_id_list:
+            try:
+                _build_package(pkg_id, ctx, formats[pkg_id])
+                results[pkg_id] = None
+            except Exception as e:
+                results[pkg_id] = e
+        return results
+
+    if executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = {pkg_id: pool.submit(_build_package, pkg_id, ctx, formats[pkg_id]) for pkg_id in pkg_id_list}
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ctx,))
+        futures = {pkg_id: pool.submit(_build_package_in_worker, pkg_id, formats[pkg_id]) for pkg_id in pkg_id_list}
+    
+    with pool:
+        for pkg_id, future in futures.items():
+            results[pkg_id] = future.exception()
+            if executor == 'process' and results[pkg_id] is None:
+                _add_population_cache_stats(future.result())
+
+    return results
+
+def generate_packages(pkg_id_list, workers=1, executor='thread', force=False):
+    """Generate multiple packaged datasets in ``@/dataset`` whose inputs changed.
+
+    All packages are generated from a single snapshot of the database. Each
+    package is first fingerprinted from its ``Output``, ``Indicator``,
+    ``SimpleCount`` and population rows and compared with the
+    ``PackageManifest`` table; packages whose fingerprint, zipped file and
+    exported files are unchanged since they were last generated are skipped,
+    and the reason for rebuilding every other package is printed. The
+    manifest is updated once a package is successfully generated.
+    Outputs are also exported in the formats set by ``set_export_formats()``.
+
+    With more than one worker, each package is built independently. A
+    thread pool shares the snapshot, whose tables are still read only when
+    needed. For a process pool, the snapshot is preloaded with everything
+    the packages need and detached from the database first, then sent to
+    each worker process once at start-up; the hits and misses of the
+    population caches of the workers are added to this process's counts.
+    The process pool must only be used from a program whose main module is
+    safe to import in a worker process.
+
+    Args:
+        pkg_id_list (list): Package IDs as in the ``Package`` table in database.
+        workers (int): Number of packages to build at the same time.
+        executor (str): Worker type, either "thread" or "process".
+        force (bool): If True, all packages are generated even if unchanged.
+
+    Returns:
+        dict: Package IDs mapped to None for success or the raised exception otherwise.
+    """
+    if executor not in ['thread', 'process']:
+        raise ValueError('ERROR: Invalid executor type! Must be "thread" or "process".')
+
+    results = {}
+    plans = {}
+    skipped = []
+    with GenerationContext() as ctx:
+        manifest = database.fetch_package_manifest()
+        for pkg_id in pkg_id_list:
+            try:
+                plan = _plan_package(pkg_id, ctx, manifest, force, get_export_formats(pkg_id))
+            except Exception as e:
+                results[pkg_id] = e
+                continue
+
+            if plan['reason'] is None:
+                print(f'NOTE: Dataset "{plan["name"]}" is unchanged and skipped.')
+                results[pkg_id] = None
+                skipped.append(pkg_id)
+            else:
+                print(f'NOTE: Dataset "{plan["name"]}" is rebuilt: {plan["reason"]}.')
+                plans[pkg_id] = plan
+
+        if executor == 'process' and workers is not None and workers > 1:
+            ctx.preload(list(plans))
+        results.update(_build_packages(list(plans), ctx, workers, executor))
+
+    for pkg_id, plan in plans.items():
+        if results[pkg_id] is None:
+            database.update_package_manifest(
+                pkg_id, plan['fingerprint'], plan['outputs'], _hash_file(plan['path']),
+                {export: _hash_file(export) for export in plan['exports']}
+            )
+
+    rebuilt = sum([results[pkg_id] is None for pkg_id in plans])
+    print(f'NOTE: {rebuilt} of {len(pkg_id_list)} dataset packages rebuilt, {len(skipped)} unchanged.')
+    return {pkg_id: results[pkg_id] for pkg_id in pkg_id_list}
+
+def generate_packages_by_source_group(source_group, workers=1, executor='thread', force=False):
+    """Generate dataset packages for a provided source group whose inputs changed.
+
+    Args:
+        source_group (int): Source group as in the ``Output`` table in database.
+        workers (int): Number of packages to build at the same time.
+        executor (str): Worker type, either "thread" or "process".
+        force (bool): If True, all packages are generated even if unchanged.
+
+    Returns:
+        bool: True if all packages are generated, False otherwise.
+    """
     try:
-        output = database.fetch_table('Output')
+        output = database.fetch_tables(['Output'])[0]
         out_source = output[output['source_group'] == source_group]
         pkg_id_list = out_source['fk_output_package'].unique().tolist()
-        for pkg_id in pkg_id_list:
-            generate_package(pkg_id)
+        results = generate_packages(pkg_id_list, workers, executor, force)
+
+        for pkg_id, error in results.items():
+            if error is not None:
+                print(f'ERROR: Cannot generate dataset package {pkg_id}: {error}')
+
+        stats = get_population_cache_stats()
+        print(f'NOTE: population cache: {stats["hits"]} hits, {stats["misses"]} misses.')
         
-        return True
+        return all([error is None for error in results.values()])
     except Exception as e:
         print(e)
-        return False
\ No newline at end of file
+        return False
+
+def _dump_json(obj):
+    """Return compact JSON bytes of an object with sorted keys."""
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def _write_shard(path, content, old_hash):
+    """Write a JSON file of the static API unless its content is unchanged.
+
+    The file is written to a temporary file first and then moved into
+    place, so that a partially written file is never served.
+
+    Args:
+        path (str): Path of the file.
+        content (bytes): Content of the file.
+        old_hash (str): SHA-256 hash of the content previously written, if any.
+
+    Returns:
+        tuple: SHA-256 hash of the content and whether the file was written.
+    """
+    new_hash = hashlib.sha256(content).hexdigest()
+    if new_hash == old_hash and os.path.exists(path):
+        return new_hash, False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(f'{path}.tmp', path)
+    return new_hash, True
+
+def _columns(rows, names):
+    """Return rows of tuples as a dict of value lists, one per name."""
+    return {name: [row[i] for row in rows] for i, name in enumerate(names) if name is not None}
+
+def _get_indicator_meta(indicator, output):
+    """Return indicator IDs mapped to their names and output names for the static API."""
+    duplicated = indicator.loc[indicator['id'].duplicated(), 'id'].unique().tolist()
+    if len(duplicated) > 0:
+        raise ValueError(f'ERROR: Duplicate indicator ids in "Indicator": {", ".join(str(int(i)) for i in duplicated)}.')
+
+    output_names = {int(out_id): name for out_id, name in zip(output['id'], output['name'])}
+    return {
+        int(ind_id): {'name': name, 'output': output_names.get(int(out_id)) if pd.notna(out_id) else None}
+        for ind_id, name, out_id in zip(indicator['id'], indicator['name'], indicator['fk_indicator_output'])
+    }
+
+def export_api(dirname=_API_DIR):
+    """Export a static JSON API of published counts and population in ``@/api``.
+
+    This function writes one small JSON file per indicator,
+    ``indicator/<id>.json``, with its values by year and county, and one per
+    county, ``county/<id>.json``, with its values by indicator and year and
+    its population by population code and year. Values are masked as in
+    generated packages. An ``index.json`` file lists every shard with its
+    SHA-256 hash; shards whose content is unchanged since the last export
+    are not rewritten, and shards no longer in the data are deleted.
+
+    Args:
+        dirname (str): Directory to export the API to.
+
+    Returns:
+        dict: Numbers of shards ``written``, ``unchanged`` and ``deleted``.
+    """
+    try:
+        index_path = os.path.join(dirname, 'index.json')
+        old_index = {'indicator': {}, 'county': {}}
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                old_index = json.load(f)
+
+        index = {'indicator': {}, 'county': {}}
+        stats = {'written': 0, 'unchanged': 0, 'deleted': 0}
+
+        def save(kind, key, obj, meta):
+            path = os.path.join(dirname, kind, f'{key}.json')
+            old_hash = old_index[kind].get(str(key), {}).get('hash')
+            new_hash, written = _write_shard(path, _dump_json(obj), old_hash)
+            stats['written' if written else 'unchanged'] += 1
+            index[kind][str(key)] = dict(meta, hash=new_hash)
+
+        transaction = database.begin_read()
+        try:
+            county, indicator, output = database.fetch_snapshot(['County', 'Indicator', 'Output'])
+            county_names = {int(cty_id): name for cty_id, name in zip(county['id'], county['county_name'])}
+            indicator_meta = _get_indicator_meta(indicator, output)
+
+            for ind_id, rows in itertools.groupby(database.iter_published_counts('indicator'), key=lambda row: int(row[0])):
+                if ind_id not in indicator_meta:
+                    raise ValueError(f'ERROR: Indicator id {ind_id} in "SimpleCount" is not in "Indicator".')
+                rows = [(ind_id, int(cty_id), year, value) for _, cty_id, year, value in rows]
+                meta = dict(indicator_meta[ind_id], rows=len(rows))
+                save('indicator', ind_id, dict(meta, id=ind_id, **_columns(rows, [None, 'county', 'year', 'value'])), meta)
+
+            population = {}
+            for cty_id, rows in itertools.groupby(database.iter_population_rollup(), key=lambda row: int(row[0])):
+                population[cty_id] = {
+                    str(int(code)): _columns(list(code_rows), [None, None, 'year', 'value'])
+                    for code, code_rows in itertools.groupby(rows, key=lambda row: row[1])
+                }
+
+            counts = itertools.groupby(database.iter_published_counts('county'), key=lambda row: int(row[1]))
+            for cty_id, rows in counts:
+                values = {
+                    str(ind_id): _columns(list(ind_rows), [None, None, 'year', 'value'])
+                    for ind_id, ind_rows in itertools.groupby(rows, key=lambda row: int(row[0]))
+                }
+                meta = {'name': county_names.get(cty_id)}
+                obj = dict(meta, id=cty_id, indicators=values, population=population.pop(cty_id, {}))
+                save('county', cty_id, obj, meta)
+            for cty_id, pop in sorted(population.items()):
+                meta = {'name': county_names.get(cty_id)}
+                save('county', cty_id, dict(meta, id=cty_id, indicators={}, population=pop), meta)
+        finally:
+            if transaction:
+                database.end_read()
+
+        for kind in index:
+            for key in set(old_index.get(kind, {})) - set(index[kind]):
+                path = os.path.join(dirname, kind, f'{key}.json')
+                if os.path.exists(path):
+                    os.remove(path)
+                stats['deleted'] += 1
+
+        old_hash = _hash_file(index_path)
+        _write_shard(index_path, _dump_json(index), old_hash)
+
+        print(f'NOTE: API is exported: {stats["written"]} shards written, ' +\
+            f'{stats["unchanged"]} unchanged, {stats["deleted"]} deleted.')
+        return stats
+    except:
+        print('ERROR: Cannot export the static API!')
+        raise
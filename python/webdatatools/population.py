@@ -2,7 +2,7 @@
 
 This module offer functions to automate the process of updating
 the ``Population`` table in the database file, ``@/database/database.db``.
-The module depends on ``database``, ``inputtools`` and ``outputtools`` modules.
+The module depends on ``database``, ``download``, ``inputtools``, ``outputtools`` and ``sourcecache`` modules.
 
 The module contains the following public functions to be called externally:
 
@@ -12,15 +12,16 @@ The module contains the following public functions to be called externally:
 
 """
 import pandas as pd
-import requests
 
 from io import BytesIO
 from urllib.error import HTTPError
 from zipfile import ZipFile
 
 from . import database
+from . import download
 from . import inputtools
 from . import outputtools
+from . import sourcecache
 
 def init():
     """Initialize the ``population`` module."""
@@ -34,32 +35,82 @@ def init():
     global _CONN
     global _NAME
     global _TEMP_NAME
+    global _TRANSFORM_VERSION
+    global _BLOCK_SIZE
 
     _CONN = database.CONN
     _NAME = 'Population'
     _TEMP_NAME = f'Temp{_NAME}'
+    # bump when the filtering of the source files changes so that
+    # tables cached by ``sourcecache`` are not reused
+    _TRANSFORM_VERSION = 1
+    _BLOCK_SIZE = 1024 * 1024
     
-def _filter_illinois(df):
-    """Filter to keep population estimates for Illinois only."""
-    pattern = f'^\d{{{df["raw_value"].str.len().max() - 17}}}17'
-    return df[df['raw_value'].str.contains(pattern)].reset_index(drop=True)
+def _iter_lines(content):
+    """Yield the lines of a binary file object, reading it block by block."""
+    global _BLOCK_SIZE
+
+    rest = b''
+    while True:
+        block = content.read(_BLOCK_SIZE)
+        if not block:
+            break
+        lines = (rest + block).split(b'\n')
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+def _filter_illinois(content):
+    """Filter to keep population estimates for Illinois only.
+
+    The lines of a fixed-width source file are read one at a time, and only
+    those with the Illinois state FIPS code ("17") at 17 characters from the
+    end of the line, preceded by digits only, are kept. Memory use therefore
+    scales with the number of Illinois records rather than the national file.
+
+    Args:
+        content: Binary file object of the source file.
+
+    Returns:
+        pandas.DataFrame: Population estimates for Illinois as raw lines in the ``raw_value`` column.
+    """
+    try:
+        n_lines = 0
+        kept = []
+        for line in _iter_lines(content):
+            n_lines += 1
+            line = line.rstrip(b'\r')
+            i = len(line) - 17
+            if i > 0 and line[i:i+2] == b'17' and line[:i].isdigit():
+                kept.append(line.decode('latin-1'))
+
+        print(f'NOTE: {len(kept):,} of {n_lines:,} lines are kept for Illinois.')
+        return pd.DataFrame({'raw_value': kept})
+    except:
+        raise
 
 def _fetch_data_helper(raw_input):
     try:
         zip = ZipFile(raw_input)
-        content = zip.open(zip.namelist()[0])
-        fetched = pd.read_table(content, header=None, names=['raw_value'])
-        return _filter_illinois(fetched)
+        with zip.open(zip.namelist()[0]) as content:
+            return _filter_illinois(content)
     except:
         raise
 
+def _get_source_url(v, y):
+    """Return the URL of a single year population estimates data file."""
+    filename = f'pcen_v{v}_y{y}_jul.txt.zip' if y % 10 == 0  else f'pcen_v{v}_y{y}.txt.zip'
+    return f'https://ftp.cdc.gov/pub/health_statistics/nchs/Datasets/NVSS/bridgepop/{v}/{filename}'
+
 def _fetch_data_auto_helper(v, y):
     """Automatically fetch a single year population estimates for Illinois.
 
     This function fetches a single population estimates data from the source
     ftp server, which contains the Bridged-Race Population Estimates datasets
     prepared by the National Center for Health Statistics of the Centers for
-    Disease Control and Prevention.
+    Disease Control and Prevention. The filtered data is reused from
+    ``sourcecache`` if the file has not changed since it was last filtered.
 
     Args:
         v (int): Version year (YYYY) for the population data.
@@ -69,17 +120,22 @@ def _fetch_data_auto_helper(v, y):
         pandas.DataFrame: Single year population estimates for Illinois.
     
     """
-    filename = f'pcen_v{v}_y{y}_jul.txt.zip' if y % 10 == 0  else f'pcen_v{v}_y{y}.txt.zip'
-    url = f'https://ftp.cdc.gov/pub/health_statistics/nchs/Datasets/NVSS/bridgepop/{v}/{filename}' 
-    print(f'WAIT: Fetching {filename}...')
-
-    res = requests.get(url, verify=False)
-    if res.status_code == 200:
-        return _fetch_data_helper(BytesIO(res.content))
-    elif res.status_code == 404:
-        raise ValueError('WARNING: Population is up to date!')
-    else:
-        res.raise_for_status()
+    url = _get_source_url(v, y)
+    print(f'WAIT: Fetching {url.split("/")[-1]}...')
+
+    try:
+        content = download.fetch(url, verify=False)
+    except HTTPError as e:
+        if e.code == 404:
+            raise ValueError('WARNING: Population is up to date!')
+        raise
+
+    fingerprint = sourcecache.get_fingerprint([content], _TRANSFORM_VERSION)
+    fetched = sourcecache.load('population', f'v{v}_y{y}', fingerprint)
+    if fetched is None:
+        fetched = _fetch_data_helper(BytesIO(content))
+        sourcecache.store('population', f'v{v}_y{y}', fingerprint, fetched)
+    return fetched
 
 def _fetch_data_auto(multi=True):
     """Automatically fetch the latest population estimates data.
@@ -87,7 +143,7 @@ def _fetch_data_auto(multi=True):
     This function fetches the latest population data from the source ftp server,
     which contains the Bridged-Race Population Estimates datasets prepared by
     the National Center for Health Statistics of the Centers for Disease Control
-    and Prevention.
+    and Prevention. The files for all years are downloaded at the same time.
 
     Args:
         multi (bool): Fetching all estimates since the latest census year if True; the latest year's estimates only if False. 
@@ -106,15 +162,12 @@ def _fetch_data_auto(multi=True):
         y = v - 2000
         y_all = range(y - (y % 10), y + 1) if multi else range(y, y + 1)
 
-        population_raw_input = pd.DataFrame()
-        for y_each in y_all:
-            try:
-                fetched = _fetch_data_auto_helper(v, y_each)
-                population_raw_input = population_raw_input.append(fetched).reset_index(drop=True)
-            except:
-                raise
+        # errors are thrown by _fetch_data_auto_helper() below
+        download.fetch_many([_get_source_url(v, y_each) for y_each in y_all], verify=False, return_exceptions=True)
+
+        fetched_list = [_fetch_data_auto_helper(v, y_each) for y_each in y_all]
     
-        return population_raw_input
+        return pd.concat(fetched_list, ignore_index=True)
     except:
         raise
 
@@ -192,20 +245,26 @@ def _create_temp(population_input):
 
 def _delete_outdated_in_master(name_temp, name_master):
     """Delete from the master table all records to be outdated due to update.
+
+    The deletion is not committed, so that it can be rolled back together
+    with the rest of the update.
     
     Args:
         name_temp (str): Name of the temporary table.
         name_master (str): Name of the master table.
 
+    Returns:
+        tuple: The minimum and maximum years in the temporary table.
+
     """
     try:
         c = _CONN.cursor()
         c.execute(f'SELECT MIN(year) FROM {name_temp};')
-        year_min_t = c.fetchone()
+        year_min_t = c.fetchone()[0]
         c.execute(f'SELECT MAX(year) FROM {name_temp};')
-        year_max_t = c.fetchone()
+        year_max_t = c.fetchone()[0]
         c.execute(f'SELECT MAX(year) FROM {name_master};')
-        year_max_m = c.fetchone()
+        year_max_m = c.fetchone()[0]
         c.close()
 
         if year_max_t <= year_max_m:
@@ -213,7 +272,7 @@ def _delete_outdated_in_master(name_temp, name_master):
         else:
             sql = f'DELETE FROM {name_master} WHERE year BETWEEN {year_min_t} AND {year_max_t};'
             database.execute_simple_sql(sql)
-            database.commit()
+            return year_min_t, year_max_t
     except:
         raise
 
@@ -223,16 +282,27 @@ def _add_to_master():
     This function calls another function with the same name from the
     ``database`` module to append the temporary population table
     (``TempPopulation``) to the master ``Population`` table in the SQL database
-    (``@/database/cjia_webdata.db``).
+    (``@/database/cjia_webdata.db``), and then refreshes the aggregated
+    population in ``PopulationRollup`` for the updated years. Deleting the
+    outdated records, adding the new ones and refreshing the rollup are done
+    in one transaction, so a failure leaves the database unchanged.
     
     """
+    global _CONN
     global _TEMP_NAME
     global _NAME
 
     try:
-        _delete_outdated_in_master(_TEMP_NAME, _NAME)
-        database.add_to_master(_TEMP_NAME, _NAME)
+        if _CONN.in_transaction:
+            _CONN.commit()
+        _CONN.execute('BEGIN;')
+        year_min, year_max = _delete_outdated_in_master(_TEMP_NAME, _NAME)
+        if database.add_to_master(_TEMP_NAME, _NAME, autocommit=False) is None:
+            raise ValueError(f'ERROR: Cannot add {_TEMP_NAME} table to {_NAME} table in the database!')
+        database.refresh_population_rollup(year_min, year_max, autocommit=False)
+        database.commit()
     except:
+        _CONN.rollback()
         raise
 
 def _delete_temp():
@@ -0,0 +1,112 @@
+"""Offer functions for counting source records by declarative indicator rules.
+
+This module offer functions to turn raw records of a data source into
+``SimpleCount`` values. Each indicator is declared as a rule, a pair of the
+indicator ID and a predicate over the source columns, for example::
+
+    (1602, {'admtypo3': 1, 'offtype': 1})
+
+A predicate maps column names to conditions that must all hold. A condition
+is a single value (equality), a list, tuple, set or range of values
+(membership), or a ``Not`` of either. Conditions shared by several rules are
+evaluated only once per source table, and all rules are counted in a single
+pass. The module is intended to be used by the ``simplecount`` module rather
+than directly imported by the main program.
+
+The module contains the following public functions to be called externally:
+
+``evaluate_rules()`` returns a boolean matrix of the records matched by each rule.
+``count_by_rules()`` counts the records matched by each rule per year and county.
+
+The module also provides the ``Not`` class for negated conditions.
+"""
+import numpy as np
+import pandas as pd
+
+class Not:
+    """Condition that holds where the wrapped condition does not.
+
+    Attributes:
+        condition: A single value or a list, tuple, set or range of values.
+    """
+    def __init__(self, condition):
+        self.condition = condition
+
+    def __repr__(self):
+        return f'Not({self.condition!r})'
+
+def _get_condition_key(condition):
+    """Return a hashable key identifying a condition."""
+    if isinstance(condition, Not):
+        return ('not', _get_condition_key(condition.condition))
+    elif isinstance(condition, (list, tuple, set, frozenset, range)):
+        return ('in', tuple(sorted(condition, key=repr)))
+    else:
+        return ('eq', condition)
+
+def _evaluate_condition(series, condition):
+    """Return a boolean array of the values of a column meeting a condition."""
+    if isinstance(condition, Not):
+        return ~_evaluate_condition(series, condition.condition)
+    elif isinstance(condition, (list, tuple, set, frozenset, range)):
+        return series.isin(list(condition)).to_numpy(dtype=bool)
+    else:
+        return (series == condition).to_numpy(dtype=bool)
+
+def evaluate_rules(df, rules):
+    """Return a boolean matrix of the records matched by each rule.
+
+    Args:
+        df (pandas.DataFrame): Raw records of a data source.
+        rules (list): Rules as pairs of an indicator ID and a predicate.
+
+    Returns:
+        pandas.DataFrame: Boolean table with the index of ``df`` and a column per indicator.
+    """
+    try:
+        masks = {}
+        cache = {}
+        for ind_id, predicate in rules:
+            if ind_id in masks:
+                raise ValueError(f'ERROR: Indicator {ind_id} is declared by more than one rule!')
+
+            mask = np.ones(len(df), dtype=bool)
+            for column, condition in predicate.items():
+                key = (column, _get_condition_key(condition))
+                if key not in cache:
+                    cache[key] = _evaluate_condition(df[column], condition)
+                mask = mask & cache[key]
+            masks[ind_id] = mask
+
+        return pd.DataFrame(masks, index=df.index)
+    except:
+        raise
+
+def count_by_rules(df, rules):
+    """Count the records matched by each rule per year and county in a single pass.
+
+    The boolean matrix of ``evaluate_rules()`` is summed by year and county
+    in a single grouped reduction. As with counting the records matched by
+    each rule separately, combinations without any matched records are left out.
+
+    Args:
+        df (pandas.DataFrame): Raw records with ``year`` and ``fk_simplecount_county`` columns.
+        rules (list): Rules as pairs of an indicator ID and a predicate.
+
+    Returns:
+        pandas.DataFrame: Data in ``SimpleCount`` format, sorted by indicator, year and county.
+    """
+    try:
+        g = ['year', 'fk_simplecount_county']
+        matrix = evaluate_rules(df, rules)
+        matrix.columns.name = 'fk_simplecount_indicator'
+
+        summed = matrix.groupby([df[g[0]], df[g[1]]]).sum()
+        out = summed.stack().reset_index(name='value')
+        out = out[out['value'] > 0] \
+            .sort_values(['fk_simplecount_indicator'] + g) \
+            .reset_index(drop=True)
+
+        return out[['fk_simplecount_indicator', 'fk_simplecount_county', 'year', 'value']]
+    except:
+        raise
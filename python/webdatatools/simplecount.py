@@ -2,26 +2,39 @@
 
 This module offer functions to automate the process of updating
 the ``SimpleCount`` table in the database file, ``@/database/database.db``.
-The module depends on ``database``, ``inputtools`` and ``outputtools`` modules.
+The module depends on ``database``, ``download``, ``inputtools``, ``outputtools``, ``rules``, ``sourcecache`` and ``sqlserver`` modules.
 
 The module contains the following public functions to be called externally:
 
 ``init()`` initalizes the ``simplecount`` module.
 ``fetch_input_and_create_temp()`` fetches input and create a temporary output.
 ``finalize_update()`` finalizes the process of updating the ``SimpleCount`` table.
+``get_updated_outputs()`` returns output ids affected by the latest update.
+``fetch_all_and_create_temp()`` fetches multiple sources concurrently and creates a temporary output.
+``get_source_status()`` returns the status of each source in the latest multi-source fetch.
+``backfill_and_create_temp()`` fetches multiple sources for a range of years and creates a temporary output.
 
 """
 import math
 import pandas as pd
 import pyodbc
 import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
 
 from urllib.error import HTTPError
 from xlrd import XLRDError
 
 from . import database
+from . import download
 from . import inputtools
 from . import outputtools
+from . import rules
+from . import sourcecache
+from . import sqlserver
 
 def init():
     """Initialize the ``simplecount`` module."""
@@ -38,8 +51,19 @@ def init():
     global _TEMP_NAME
     global _SIMPLECOUNT_COLUMNS
     global _UCR_INDICATOR_DICT
+    global _UPDATED_OUTPUTS
+    global _SOURCE_OUTPUTS
+    global _SOURCE_STATUS
+    global _DB_LOCK
+    global _SQL_SERVER_CHUNK_SIZE
+    global _RANGE_SOURCES
+    global _TRANSFORM_VERSION
+    global _IDOC_RULES
+    global _IDJJ_ADMISSION_RULES
+    global _IDJJ_EXIT_RULES
     
     _CONN = database.CONN
+    _DB_LOCK = threading.Lock()
     _NAME = 'SimpleCount'
     _TEMP_NAME = f'Temp{_NAME}' 
     _SIMPLECOUNT_COLUMNS = ['fk_simplecount_indicator', 'fk_simplecount_county', 'year', 'value']
@@ -73,6 +97,71 @@ def init():
         'ahtsex':1440,
         'ahtserve':1441,
     }
+    _UPDATED_OUTPUTS = None
+    _SOURCE_OUTPUTS = {
+        'chri': [9],
+        'idoc': [10],
+        'idjj': [11, 12, 34, 35],
+        'ucr': [13, 14, 15, 16, 17, 18, 19, 20],
+        'jail': [22],
+        'employment': [27],
+        'poverty': [30, 31]
+    }
+    _SOURCE_STATUS = None
+    _SQL_SERVER_CHUNK_SIZE = 100000
+    _RANGE_SOURCES = ['chri', 'idoc', 'idjj']
+    # bump when a transformation of downloaded or network drive files changes
+    # so that tables cached by ``sourcecache`` are not reused
+    _TRANSFORM_VERSION = 1
+
+    # IDOC prison admissions: new court commitments (admtypo3 1),
+    # technical violators (admtypo3 2), and new court commitments by
+    # offense type and sex
+    _IDOC_RULES = [
+        (1600, {'admtypo3': 1}),
+        (1601, {'admtypo3': 2}),
+        (1602, {'admtypo3': 1, 'offtype': 1}),
+        (1603, {'admtypo3': 1, 'offtype': 2}),
+        (1604, {'admtypo3': 1, 'offtype': 3}),
+        (1605, {'admtypo3': 1, 'offtype': 4}),
+        (1606, {'admtypo3': 1, 'offtype': 7}),
+        (1607, {'admtypo3': 1, 'offtype': 1}),
+        (1620, {'admtypo3': 1, 'sex': 'M'}),
+        (1621, {'admtypo3': 1, 'sex': rules.Not('M')}),
+    ]
+
+    # IDJJ admissions and exits: new admissions, court evaluations and
+    # technical violators, and new admissions by sex, race, offense type
+    # and offense class, each for ages 13-16 and 17-20
+    idjj_new = ['CE', 'CER', 'DR', 'IC', 'MVN', 'PVN', 'RAM']
+    idjj_felony = ['M', 'X', 1, 2, 3, 4]
+    idjj_ages = [range(13, 16+1), range(17, 20+1)]
+    idjj_rule_table = [
+        # (admissions 13-16, admissions 17-20, exits 13-16, exits 17-20), predicate
+        ((701, 704, 751, 754), {'admtypo': idjj_new}),
+        ((702, 705, 752, 755), {'admtypo': 'CE'}),
+        ((703, 706, 753, 756), {'admtypo': ['TMV', 'TPV']}),
+        ((710, 712, 760, 762), {'admtypo': idjj_new, 'sex': 'M'}),
+        ((711, 713, 761, 763), {'admtypo': idjj_new, 'sex': rules.Not('M')}),
+        ((720, 723, 770, 773), {'admtypo': idjj_new, 'race': 'WHI'}),
+        ((721, 724, 771, 774), {'admtypo': idjj_new, 'race': 'BLK'}),
+        ((722, 725, 772, 775), {'admtypo': idjj_new, 'race': 'HSP'}),
+        ((730, 735, 780, 785), {'admtypo': idjj_new, 'offtype9': 1}),
+        ((731, 736, 781, 786), {'admtypo': idjj_new, 'offtype9': 2}),
+        ((732, 737, 782, 787), {'admtypo': idjj_new, 'offtype9': 3}),
+        ((733, 738, 783, 788), {'admtypo': idjj_new, 'offtype9': 4}),
+        ((734, 739, 784, 789), {'admtypo': idjj_new, 'offtype9': 5}),
+        ((740, 742, 790, 792), {'admtypo': idjj_new, 'hclass': idjj_felony}),
+        ((741, 743, 791, 793), {'admtypo': idjj_new, 'hclass': rules.Not(idjj_felony)}),
+    ]
+    _IDJJ_ADMISSION_RULES = [
+        (ids[i], dict(predicate, age=idjj_ages[i]))
+        for ids, predicate in idjj_rule_table for i in range(2)
+    ]
+    _IDJJ_EXIT_RULES = [
+        (ids[i+2], dict(predicate, age=idjj_ages[i]))
+        for ids, predicate in idjj_rule_table for i in range(2)
+    ]
 
 # automatic updating general
 def _get_max_year(out_id_list):
@@ -89,32 +178,33 @@ def _get_max_year(out_id_list):
         max_year = c.fetchall()[0][0]
         c.close()
 
+        if max_year is None:
+            raise ValueError('ERROR: No existing records to find the next year from!')
         return int(max_year)
     except:
         raise
 
-def _fetch_from_ms_sql_server(database, table, columns=None, condition=None):
-    """Fetch a simple select query result from the MS SQL Server.
+def _query_ms_sql_server(database, table, sql, params=None):
+    """Return the result of a query on a table in the MS SQL Server.
+
+    Connections are checked out of the pool of the ``sqlserver`` module and
+    the ``{table}`` placeholder in the query is replaced with the table name
+    qualified by ``sqlserver.qualify()``, so that a local database with the
+    same table shape, e.g. SQLite, can stand in for the server through
+    ``sqlserver.configure()``.
     
     Args:
         database (str): Database in the MS SQL Server (SPAC2SVR).
-        table (str): Table for FROM statement.
-        columns (str): Columns for SQL SELECT statement. If None, * is used.
-        condition (str): Condition for SQL WHERE statement.
+        table (str): Table for the ``{table}`` placeholder.
+        sql (str): Query with the ``{table}`` placeholder.
+        params (list): Parameters of the query.
     
     Returns:
         pandas.DataFrame: A query result with lowercased column names. If empty, ValueError is thrown.
     """
     try:
-        params = f'DRIVER=SQL Server;SERVER=SPAC2SVR;PORT=1433;DATABASE={database}'
-        conn = pyodbc.connect(params)
-
-        columns = columns if columns is not None else '*'
-        sql = f'SELECT {columns} FROM {database}.dbo.{table}'
-        sql += f' WHERE {condition}' if condition is not None else ''
-        
-        df = pd.read_sql(sql, conn)
-        conn.close()
+        sql = sql.format(table=sqlserver.qualify(database, table))
+        df = sqlserver.query(database, sql, params)
 
         if df.empty:
             raise ValueError('ERROR: No records found in the MS SQL Server - Data may be up to date!')
@@ -127,51 +217,116 @@ def _fetch_from_ms_sql_server(database, table, columns=None, condition=None):
     except:
         raise
 
-# automatic updating of CHRI data
-def _transform_chri(df):
-    """Transforms a raw CHRI query result into a proper format."""
+def _iter_ms_sql_server(database, table, sql, params=None, chunksize=None):
+    """Yield the result of a query on a table in the MS SQL Server in chunks of rows.
+
+    This function works as ``_query_ms_sql_server()`` but reads the result
+    ``chunksize`` rows at a time, so that only one chunk is held in memory.
+    
+    Args:
+        database (str): Database in the MS SQL Server (SPAC2SVR).
+        table (str): Table for the ``{table}`` placeholder.
+        sql (str): Query with the ``{table}`` placeholder.
+        params (list): Parameters of the query.
+        chunksize (int): Number of rows per chunk. If None, ``_SQL_SERVER_CHUNK_SIZE`` is used.
+    
+    Yields:
+        pandas.DataFrame: A chunk of the query result with lowercased column names.
+            If the result is empty, ValueError is thrown.
+    """
+    global _SQL_SERVER_CHUNK_SIZE
+
     try:
-        df['year'] = df['arrestyear']
-        df['county'] = df['eventori'].str[2:5].replace('CPD', '016')
-        df = df[df['county'].str.contains('\d{3}')].copy()
-        df.loc[:, 'fk_simplecount_county'] = df['county'].astype(int)
-
-        c = df['arrestage'].isin(range(10,17+1))
-        df.loc[:,'fk_simplecount_indicator'] = 4000
-        g = ['fk_simplecount_indicator', 'year', 'fk_simplecount_county']
+        sql = sql.format(table=sqlserver.qualify(database, table))
+        chunksize = chunksize or _SQL_SERVER_CHUNK_SIZE
         
-        out = df[c].groupby(g).size().reset_index(name='value')
-        return out[_SIMPLECOUNT_COLUMNS]
+        empty = True
+        for df in sqlserver.iter_query(database, sql, params, chunksize):
+            if df.empty:
+                continue
+            empty = False
+            df.columns = [i.lower() for i in df.columns.tolist()]
+            yield df
+
+        if empty:
+            raise ValueError('ERROR: No records found in the MS SQL Server - Data may be up to date!')
+    except pyodbc.Error as e:
+        if e.args[0] == '42000':
+            print(f"ERROR: Cannot access the SQL Server database: {database}!")
+        raise
+
+def _fold_counts(chunks, transform):
+    """Transform chunks of a raw query result and fold them into running counts.
+
+    Every transform in this module counts rows per indicator, year and
+    county, so the counts of the whole result are the sums of the counts of
+    its chunks. Only the running counts and one chunk are held in memory.
+
+    Args:
+        chunks (iterable): Chunks of a raw query result as pandas.DataFrame.
+        transform (function): Returns a chunk transformed into ``SimpleCount`` format.
+
+    Returns:
+        pandas.DataFrame: Data in ``SimpleCount`` format, sorted by indicator, year and county.
+    """
+    global _SIMPLECOUNT_COLUMNS
+
+    try:
+        keys = ['fk_simplecount_indicator', 'year', 'fk_simplecount_county']
+        running = None
+        for chunk in chunks:
+            counts = transform(chunk).groupby(keys)['value'].sum()
+            running = counts if running is None else pd.concat([running, counts]).groupby(level=keys).sum()
+            del chunk
+
+        return running.reset_index()[_SIMPLECOUNT_COLUMNS]
     except:
         raise
 
-def _fetch_chri_data(year=None):
+# automatic updating of CHRI data
+def _fetch_chri_data(year=None, year_to=None):
     """Automatically fetch the next year's CHRI data from the MS SQL Server.
     
     This function tries to automatically fetch the Criminal History Record
     Information (CHRI) data for a new year. The fuction fetches the following
     year's CHRI data from the ``AnnualPulls`` database  in MS SQL Server
-    (SPAC2SVR), transforms it to the proper format, and returns
-    a ``SimpleCount`` input for the relevant indicators.
+    (SPAC2SVR) and returns a ``SimpleCount`` input for the relevant indicators.
+
+    The aggregation is done by the server: the county is derived from the
+    third to fifth characters of ``EventORI`` ("CPD" for Chicago Police
+    Department becomes Cook County, "016", and other non-numeric values are
+    dropped), arrests are filtered to ages 10 to 17, and only the count per
+    county is returned. A range of years is fetched in a single query.
 
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
+        year_to (int): Last year for the new records. If None, only ``year`` is fetched.
     
     Returns:
         pandas.DataFrame: Data in ``SimpleCount`` format.
 
     """
+    global _SIMPLECOUNT_COLUMNS
+
     try:
         if year is None:
-            year = _get_max_year([9]) + 1
+            year = _get_max_year(_SOURCE_OUTPUTS['chri']) + 1
 
         database = 'AnnualPulls'
         tbl = 'Arrests'
-        cols = 'ArrestYear, ArrestAge, EventORI'
-        condition = f'ArrestYear = {year}'
-
-        df = _fetch_from_ms_sql_server(database, tbl, cols, condition)
-        return _transform_chri(df)
+        ori = 'SUBSTRING(EventORI, 3, 3)'
+        county = f"CAST(CASE WHEN {ori} = 'CPD' THEN '016' ELSE {ori} END AS INT)"
+        is_numeric = ' AND '.join([f"SUBSTRING(EventORI, {i}, 1) BETWEEN '0' AND '9'" for i in range(3, 5+1)])
+        sql = f'SELECT ArrestYear AS year, {county} AS fk_simplecount_county, COUNT(*) AS value ' +\
+            'FROM {table} ' +\
+            'WHERE ArrestYear BETWEEN ? AND ? AND ArrestAge BETWEEN 10 AND 17 ' +\
+            f"AND ({ori} = 'CPD' OR ({is_numeric})) " +\
+            f'GROUP BY ArrestYear, {county} ' +\
+            f'ORDER BY ArrestYear, {county};'
+
+        out = _query_ms_sql_server(database, tbl, sql, [int(year), int(year_to or year)])
+        out['fk_simplecount_indicator'] = 4000
+        return out[_SIMPLECOUNT_COLUMNS]
     except:
         raise
 
@@ -179,48 +334,20 @@ def _fetch_chri_data(year=None):
 def _transform_idoc(df):
     """Transforms a raw IDOC query result into a proper format."""
     global _SIMPLECOUNT_COLUMNS
+    global _IDOC_RULES
 
     try:
         df['comcnty'] = ((df['comcnty'] + 1) / 2).astype(int)
         df.columns = ['year', 'fk_simplecount_county'] + df.columns.tolist()[2:]
 
-        indicator_list = [1600, 1601, 1602, 1603, 1604, 1605, 1606, 1607, 1620, 1621]
-        
-        c_nc = df['admtypo3'] == 1
-        c_tv = df['admtypo3'] == 2
-        c_pers = df['offtype'] == 1
-        c_prop = df['offtype'] == 2
-        c_drug = df['offtype'] == 3
-        c_sex = df['offtype'] == 4
-        c_other = df['offtype'] == 7
-        c_viol = df['offtype'] == 1
-        c_male = df['sex'] == 'M'
-        c_female = ~c_male
-
-        c_first2 = [c_nc, c_tv]
-        c_others = [c_pers, c_prop, c_drug, c_sex, c_other, c_viol, c_male, c_female]
-        
-        def helper(c, indicator_id, first2):
-            df['fk_simplecount_indicator'] = indicator_id
-            g = ['fk_simplecount_indicator', 'year', 'fk_simplecount_county']
-            if first2:
-                return df[c].groupby(g).size().reset_index(name='value')
-            else:
-                return df[c_nc & c].groupby(g).size().reset_index(name='value')
-
-        out = pd.DataFrame()
-        for i in range(2):
-            out = out.append(helper(c_first2[i], indicator_list[i], first2=True))
-            
-        for i in range(len(c_others)):
-            out = out.append(helper(c_others[i], indicator_list[i+2], first2=False))
+        out = rules.count_by_rules(df, _IDOC_RULES)
 
         out = out.loc[out['fk_simplecount_county'].isin(range(1,102+1))]
         return out[_SIMPLECOUNT_COLUMNS]
     except:
         raise
 
-def _fetch_idoc_data(year=None):
+def _fetch_idoc_data(year=None, year_to=None):
     """Automatically fetch the next year's IDOC data from the MS SQL Server.
     
     This function tries to automatically fetch the Illinois Department of
@@ -228,10 +355,13 @@ def _fetch_idoc_data(year=None):
     The fuction fetches the following year's IDOC data from the
     ``PrisonMain.dbo.PrisonAdmits`` table in MS SQL Server (SPAC2SVR),
     transforms it to the proper format, and returns a ``SimpleCount`` input
-    for the relevant indicators.
+    for the relevant indicators. The query result is read and transformed in
+    chunks of rows, so that memory use stays flat however large the year is.
+    A range of years is fetched in a single query.
 
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
+        year_to (int): Last year for the new records. If None, only ``year`` is fetched.
     
     Returns:
         pandas.DataFrame: Data in ``SimpleCount`` format.
@@ -239,76 +369,38 @@ def _fetch_idoc_data(year=None):
     """
     try:
         if year is None:
-            year = _get_max_year([10]) + 1
+            year = _get_max_year(_SOURCE_OUTPUTS['idoc']) + 1
 
         database = 'PrisonMain'
         tbl = 'PrisonAdmits'
         cols = 'FiscalYr, COMCNTY, SEX, ADMTYPO3, OFFTYPE, OFFTYPE3'
-        condition = f'FiscalYr = {year}'
 
-        df = _fetch_from_ms_sql_server(database, tbl, cols, condition)
-        return _transform_idoc(df)
+        sql = f'SELECT {cols} FROM {{table}} WHERE FiscalYr BETWEEN ? AND ?'
+
+        chunks = _iter_ms_sql_server(database, tbl, sql, [int(year), int(year_to or year)])
+        return _fold_counts(chunks, _transform_idoc)
     except:
         raise
 
 # automatic updating of IDJJ data
-def _tranform_idjj(df, age1720=False, exit=False):
-    """Transform a raw IDJJ query result into a proper format."""
+def _tranform_idjj(df, exit=False):
+    """Transform a raw IDJJ query result for both age groups into a proper format."""
     global _SIMPLECOUNT_COLUMNS
+    global _IDJJ_ADMISSION_RULES
+    global _IDJJ_EXIT_RULES
 
     try:
         df.columns = ['age', 'year', 'fk_simplecount_county'] + df.columns.tolist()[3:]
 
-        if not age1720:
-            indicator_list = [701, 702, 703, 710, 711, 720, 721, 722, 730, 731, 732, 733, 734, 740, 741]
-            c_age = df['age'].isin(range(13, 16+1))
-        else:
-            indicator_list = [704, 705, 706, 712, 713, 723, 724, 725, 735, 736, 737, 738, 739, 742, 743]
-            c_age = df['age'].isin(range(17, 20+1))
-
-        if exit:
-            indicator_list = [i + 50 for i in indicator_list]
-        
-        c_new = df['admtypo'].isin(['CE', 'CER', 'DR', 'IC', 'MVN', 'PVN', 'RAM'])
-        c_ce = df['admtypo'] == 'CE'
-        c_tv = df['admtypo'].isin(['TMV', 'TPV'])
-        c_male = df['sex'] == 'M'
-        c_female = ~c_male
-        c_whi = df['race'] == 'WHI'
-        c_blk = df['race'] == 'BLK'
-        c_hsp = df['race'] == 'HSP'
-        c_pers = df['offtype9'] == 1
-        c_prop = df['offtype9'] == 2
-        c_drug = df['offtype9'] == 3
-        c_weap = df['offtype9'] == 4
-        c_sex = df['offtype9'] == 5
-        c_felo = df['hclass'].isin(['M','X',1,2,3,4])
-        c_misd = ~c_felo
-
-        c_first3 = [c_new, c_ce, c_tv]
-        c_others = [c_male, c_female, c_whi, c_blk, c_hsp, c_pers, c_prop, c_drug, c_weap, c_sex, c_felo, c_misd]
-        
-        def helper(c, indicator_id, first3):
-            df['fk_simplecount_indicator'] = indicator_id
-            g = ['fk_simplecount_indicator', 'year', 'fk_simplecount_county']
-            if first3:
-                return df[c_age & c].groupby(g).size().reset_index(name='value')
-            else:
-                return df[c_age & c_new & c].groupby(g).size().reset_index(name='value')
-
-        out = pd.DataFrame()
-        for i in range(3):
-            out = out.append(helper(c_first3[i], indicator_list[i], first3=True))
-            
-        for i in range(len(c_others)):
-            out = out.append(helper(c_others[i], indicator_list[i+3], first3=False))
+        rule_list = _IDJJ_EXIT_RULES if exit else _IDJJ_ADMISSION_RULES
+        out = rules.count_by_rules(df, rule_list)
         
         out = out[out['fk_simplecount_county'].isin(range(1,102+1))]
         return out[_SIMPLECOUNT_COLUMNS]
     except:
         raise
 
-def _fetch_idjj_data(year=None):
+def _fetch_idjj_data(year=None, year_to=None):
     """Automatically fetch the next year's IDJJ data from the MS SQL Server.
     
     This function tries to automatically fetch the Illinois Department of
@@ -316,10 +408,13 @@ def _fetch_idjj_data(year=None):
     a new year. The fuction fetches the following year's IDJJ data from
     ``PrisonMain.dbo.IDJJ_Admissions`` and ``PrisonMain.dbo.IDJJ_Exits`` tables
     in MS SQL Server (SPAC2SVR), transforms it to the proper format,
-    and returns a ``SimpleCount`` input for the relevant indicators.
+    and returns a ``SimpleCount`` input for the relevant indicators. Both
+    tables are read and transformed in chunks of rows, and a range of years
+    is fetched in a single query per table.
 
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
+        year_to (int): Last year for the new records. If None, only ``year`` is fetched.
     
     Returns:
         pandas.DataFrame: Data in ``SimpleCount`` format.
@@ -327,24 +422,48 @@ def _fetch_idjj_data(year=None):
     """
     try:
         if year is None:
-            year = _get_max_year([11, 12, 34, 35]) + 1
+            year = _get_max_year(_SOURCE_OUTPUTS['idjj']) + 1
 
         database = 'PrisonMain'
         tbl_admit = 'IDJJ_Admissions'
         tbl_exit = 'IDJJ_exits'
         cols = 'Age, SFY, County, sex, race, admtypo, OFFTYPE9, hclass'
-        condition = f'SFY = {year}'
+        sql_admit = f'SELECT {cols} FROM {{table}} WHERE SFY BETWEEN ? AND ?'
+        sql_exit = f'SELECT Exit{cols} FROM {{table}} WHERE SFY BETWEEN ? AND ?'
+        params = [int(year), int(year_to or year)]
 
-        df_a = _fetch_from_ms_sql_server(database, tbl_admit, cols, condition)
-        df_e = _fetch_from_ms_sql_server(database, tbl_exit, 'Exit'+cols, condition)
+        transform_exit = lambda df: _tranform_idjj(df, exit=True)
 
-        return (
-            pd.DataFrame()
-            .append(_tranform_idjj(df_a))
-            .append(_tranform_idjj(df_a, age1720=True))
-            .append(_tranform_idjj(df_e, exit=True))
-            .append(_tranform_idjj(df_e, age1720=True, exit=True))
-        )
+        chunks_a = _iter_ms_sql_server(database, tbl_admit, sql_admit, params)
+        out_a = _fold_counts(chunks_a, _tranform_idjj)
+        chunks_e = _iter_ms_sql_server(database, tbl_exit, sql_exit, params)
+        out_e = _fold_counts(chunks_e, transform_exit)
+
+        return pd.concat([out_a, out_e], ignore_index=True)
+    except:
+        raise
+
+def _transform_cached(source, year, contents, transform):
+    """Return transformed source data from ``sourcecache``, or transform and cache it.
+
+    Args:
+        source (str): Data source.
+        year (int): Year of the source data.
+        contents (list): Contents of the source files as bytes, whose fingerprint keys the cache.
+        transform (function): Takes no arguments and returns the transformed data.
+
+    Returns:
+        pandas.DataFrame: Data in ``SimpleCount`` format.
+    """
+    global _TRANSFORM_VERSION
+
+    try:
+        fingerprint = sourcecache.get_fingerprint(contents, _TRANSFORM_VERSION)
+        out = sourcecache.load(source, year, fingerprint)
+        if out is None:
+            out = transform()
+            sourcecache.store(source, year, fingerprint, out)
+        return out
     except:
         raise
 
@@ -375,26 +494,31 @@ def _transform_ucr_data(raw, which):
     except:
         raise
 
+def _get_ucr_url(year, which):
+    """Return the URL of a select UCR table."""
+    yy = str(year)[2:]
+    yy_pre = str(year - 1)[2:]
+
+    if which == 'index':
+        filename = f'CrimeData_{yy}_{yy_pre}.xlsx'
+    elif which == 'domestic':
+        filename = f'DomesticOffenses_{yy}_{yy_pre}.xlsx'
+    elif which == 'hate':
+        filename = f'HateCrime_{yy}_{yy_pre}.xlsx'
+    elif which == 'school':
+        filename = f'SchoolIncidents_{yy}_{yy_pre}.xlsx'
+
+    return f'http://www.isp.state.il.us/docs/cii/cii{yy}/ds/{filename}'
+
 def _fetch_ucr_data_single(year, which):
     """Fetch and return a select UCR table in a proper format."""
     try:
         yy = str(year)[2:]
-        yy_pre = str(year - 1)[2:]
-
-        if which == 'index':
-            filename = f'CrimeData_{yy}_{yy_pre}.xlsx'
-        elif which == 'domestic':
-            filename = f'DomesticOffenses_{yy}_{yy_pre}.xlsx'
-        elif which == 'hate':
-            filename = f'HateCrime_{yy}_{yy_pre}.xlsx'
-        elif which == 'school':
-            filename = f'SchoolIncidents_{yy}_{yy_pre}.xlsx'
-
-        url = f'http://www.isp.state.il.us/docs/cii/cii{yy}/ds/{filename}'
+        url = _get_ucr_url(year, which)
         
         exclude_pre = lambda x: not re.search('\d', x)
         rename_col = lambda x: x[:-2].lower() if x[-2:] == str(yy) else x.lower()
-        raw = pd.read_excel(url).rename(columns=rename_col)
+        raw = pd.read_excel(BytesIO(download.fetch(url))).rename(columns=rename_col)
         raw = raw.loc[:,raw.columns.map(exclude_pre)]
         
         return _transform_ucr_data(raw, which)
@@ -409,7 +533,9 @@ def _fetch_ucr_data(year=None):
     This function tries to automatically fetch the Illinois State Police's
     Uniform Crime Report (UCR) data for a new year. The function fetches the
     following year's UCR data from online,  transforms it to the proper format,
-    and returns a ``SimpleCount`` input for the relevant indicators.
+    and returns a ``SimpleCount`` input for the relevant indicators. The four
+    UCR tables are downloaded at the same time, and the result is reused from
+    ``sourcecache`` if none of them has changed since it was last transformed.
     
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
@@ -423,8 +549,24 @@ def _fetch_ucr_data(year=None):
     
     try:
         if year is None:
-            year = _get_max_year([13 ,14, 15, 16, 17, 18, 19, 20]) + 1
-        
+            year = _get_max_year(_SOURCE_OUTPUTS['ucr']) + 1
+
+        tables = ['index', 'domestic', 'hate', 'school']
+        contents = download.fetch_many([_get_ucr_url(year, which) for which in tables], return_exceptions=True)
+
+        # errors are thrown by _fetch_ucr_data_single() in _combine_ucr_data()
+        if any(isinstance(content, Exception) for content in contents):
+            return _combine_ucr_data(year)
+        return _transform_cached('ucr', year, contents, lambda: _combine_ucr_data(year))
+    except:
+        raise
+
+def _combine_ucr_data(year):
+    """Combine the four UCR tables of a year into a ``SimpleCount`` input."""
+    global _SIMPLECOUNT_COLUMNS
+    global _UCR_INDICATOR_DICT
+
+    try:
         index = _fetch_ucr_data_single(year, 'index')
         domestic = _fetch_ucr_data_single(year, 'domestic')
         hate = _fetch_ucr_data_single(year, 'hate')
@@ -462,7 +604,8 @@ def _fetch_laus_data(year=None):
     Employment Security's Local Area Unemployment Statistics (LAUS) data for
     a new year. The function fetches the following year's LAUS data from online, 
     transforms it to the proper format, and returns a ``SimpleCount`` input
-    for the relevant indicators.
+    for the relevant indicators. The result is reused from ``sourcecache``
+    if the file has not changed since it was last transformed.
 
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
@@ -475,10 +618,23 @@ def _fetch_laus_data(year=None):
 
     try:
         if year is None:
-            year = _get_max_year([27]) + 1
+            year = _get_max_year(_SOURCE_OUTPUTS['employment']) + 1
         url = f'http://www.ides.illinois.gov/LMI/Local%20Area%20Unemployment%20Statistics%20LAUS/historical/{year}-moaa.xls'
 
-        raw = pd.read_excel(url, skiprows=6)
+        content = download.fetch(url)
+        return _transform_cached('employment', year, [content], lambda: _transform_laus_data(content))
+    except HTTPError as e:
+        if e.code == 404:
+            raise ValueError("WARNING: Employment data is up to date.")
+    except:
+        raise
+
+def _transform_laus_data(content):
+    """Transform a raw LAUS file into a proper format."""
+    global _SIMPLECOUNT_COLUMNS
+
+    try:
+        raw = pd.read_excel(BytesIO(content), skiprows=6)
         raw.columns = ['fips', 'area', 'year', 'month', 'force', 'employed', 'unemployed', 'rate']
         
         filtered = raw[(~raw.fips.isna()) & (raw.month == 13)].drop(columns=['area', 'month', 'rate'])
@@ -494,9 +650,6 @@ def _fetch_laus_data(year=None):
         pivoted['fk_simplecount_county'] = (pivoted['fips'] + 1) / 2
 
         return pivoted[_SIMPLECOUNT_COLUMNS]
-    except HTTPError as e:
-        if e.code == 404:
-            raise ValueError("WARNING: Employment data is up to date.")
     except:
         raise
 
@@ -508,7 +661,8 @@ def _fetch_poverty_data(year=None):
     Area Income and Poverty Estimates (SAIPE) data for a new year.
     The function fetches the following year's SAIPE data from online,
     transforms it to the proper format, and returns a ``SimpleCount`` input
-    for the relevant indicators.
+    for the relevant indicators. The result is reused from ``sourcecache``
+    if the file has not changed since it was last transformed.
 
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
@@ -521,11 +675,24 @@ def _fetch_poverty_data(year=None):
 
     try:
         if year is None:
-            year = _get_max_year([30, 31]) + 1
+            year = _get_max_year(_SOURCE_OUTPUTS['poverty']) + 1
         ext = 'txt' if year > 2003 else 'dat'
         url = f'https://www2.census.gov/programs-surveys/saipe/datasets/{year}/{year}-state-and-county/est{str(year)[2:]}-il.{ext}'
 
-        raw = pd.read_table(url, header=None, skiprows=1, names=['raw'])
+        content = download.fetch(url)
+        return _transform_cached('poverty', year, [content], lambda: _transform_poverty_data(content, year))
+    except HTTPError as e:
+        if e.code == 404:
+            raise ValueError("WARNING: Poverty data is up to date.")
+    except:
+        raise
+
+def _transform_poverty_data(content, year):
+    """Transform a raw SAIPE file into a proper format."""
+    global _SIMPLECOUNT_COLUMNS
+
+    try:
+        raw = pd.read_table(BytesIO(content), header=None, skiprows=1, names=['raw'])
         pattern = '.{3}(?P<fips>.{3}).(?P<all>.{8}).{34}(?P<minor>.{8}).*'
         
         filtered = raw['raw'].str.extract(pattern)
@@ -541,24 +708,23 @@ def _fetch_poverty_data(year=None):
             )
 
         return pivoted[_SIMPLECOUNT_COLUMNS]
-    except HTTPError as e:
-        if e.code == 404:
-            raise ValueError("WARNING: Poverty data is up to date.")
     except:
         raise
 
 # automatic updating of jail data
-def _fetch_jail_data(year=None):
+def _fetch_jail_data(year=None, county=None):
     """Automatically fetch the next year's jail data from the network drive location.
     
     This function tries to automatically fetch the Illinois Department of Correction's
     Illinois County Jail Population data for a new year. The function fetches
     the following year's Illinois County Jail Population data from the network
     drive location, transforms it to the proper format, and returns
-    a ``SimpleCount`` input for the relevant indicators.
+    a ``SimpleCount`` input for the relevant indicators. The result is reused
+    from ``sourcecache`` if the file has not changed since it was last transformed.
 
     Args:
         year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
+        county (pandas.DataFrame): ``County`` table. If None, it is fetched from database.
     
     Returns:
         pandas.DataFrame: Data in ``SimpleCount`` format.
@@ -568,8 +734,22 @@ def _fetch_jail_data(year=None):
 
     try:
         if year is None:
-            year = _get_max_year([22]) + 1
-        raw = pd.read_excel(f'P:\DATA\JAIL\{year} ICJIA County SUB Totals.xls')
+            year = _get_max_year(_SOURCE_OUTPUTS['jail']) + 1
+        with open(f'P:\DATA\JAIL\{year} ICJIA County SUB Totals.xls', 'rb') as f:
+            content = f.read()
+
+        return _transform_cached('jail', year, [content], lambda: _transform_jail_data(content, year, county))
+    except FileNotFoundError:
+        raise ValueError("WARNING: Jail data is up to date.")
+    except:
+        raise
+
+def _transform_jail_data(content, year, county=None):
+    """Transform a raw jail population file into a proper format."""
+    global _SIMPLECOUNT_COLUMNS
+
+    try:
+        raw = pd.read_excel(BytesIO(content))
         
         filtered = raw[~raw['Month'].isna() & ~raw['Facility'].str.contains('Alton')]
         filtered = filtered[['Facility', 'TOTAL Number of Bookings', 'Average Monthly Pop']]
@@ -590,7 +770,8 @@ def _fetch_jail_data(year=None):
         pivoted.loc[pivoted['county'] == 'DeWitt', 'county'] = 'De Witt'
         pivoted.loc[pivoted['county'] == 'Tri-County', 'county'] = 'Tri-County Jail'
 
-        county = database.fetch_tables(['County'])[0]
+        if county is None:
+            county = database.fetch_tables(['County'])[0]
         county_id_dict = dict(zip(county['county_name'].str.lower(), county['id'].astype(int)))
         county_to_id = lambda x: county_id_dict[x.lower()]
 
@@ -599,8 +780,6 @@ def _fetch_jail_data(year=None):
         pivoted['year'] = pivoted['year'].astype(int)
 
         return pivoted[_SIMPLECOUNT_COLUMNS]
-    except FileNotFoundError:
-        raise ValueError("WARNING: Jail data is up to date.")
     except:
         raise
 
@@ -630,32 +809,103 @@ def _fetch_input():
     except:
         raise
 
-def _fetch_input_auto(source):
-    """Fetch and return a prepared input data file based on source input."""
+def _fetch_input_auto(source, year=None, county=None, year_to=None):
+    """Fetch and return a prepared input data file based on source input.
+
+    Args:
+        source (str): Data source.
+        year (int): Year for the new records. If None, automatically uses the year after the current maximum year in database.
+        county (pandas.DataFrame): ``County`` table for the jail data. If None, it is fetched from database.
+        year_to (int): Last year for the new records from the MS SQL Server sources
+            (see ``_RANGE_SOURCES``). If None, only ``year`` is fetched.
+    """
     if source not in ['chri', 'idoc', 'idjj', 'ucr', 'jail', 'employment', 'poverty']:
         raise ValueError('Invalid data source.')
     
     if source == 'chri':
         print('WAIT: Fetching Criminal History data...')
-        return _fetch_chri_data()
+        return _fetch_chri_data(year, year_to)
     elif source == 'idoc':
         print('WAIT: Fetching Prison data...')
-        return _fetch_idoc_data()
+        return _fetch_idoc_data(year, year_to)
     elif source == 'idjj':
         print('WAIT: Fetching Juvenile Court data...')
-        return _fetch_idjj_data()
+        return _fetch_idjj_data(year, year_to)
     elif source == 'ucr':
         print('WAIT: Fetching Uniform Crime Report data...')
-        return _fetch_ucr_data()
+        return _fetch_ucr_data(year)
     elif source == 'jail':
         print('WAIT: Fetching Jail data...')
-        return _fetch_jail_data()
+        return _fetch_jail_data(year, county)
     elif source == 'employment':
         print('WAIT: Fetching Employment data...')
-        return _fetch_laus_data()
+        return _fetch_laus_data(year)
     elif source == 'poverty':
         print('WAIT: Fetching Poverty data...')
-        return _fetch_poverty_data()
+        return _fetch_poverty_data(year)
+
+def _fetch_timed(source, year, county, year_to=None):
+    """Fetch a source as ``_fetch_input_auto()`` and return the result with the year and elapsed seconds.
+
+    If ``year`` is None, the year after the current maximum year of the
+    source is looked up first. Worker threads share the database connection,
+    so the lookup holds ``_DB_LOCK``.
+    """
+    global _DB_LOCK
+    global _SOURCE_OUTPUTS
+
+    if year is None:
+        with _DB_LOCK:
+            year = _get_max_year(_SOURCE_OUTPUTS[source]) + 1
+    start = time.perf_counter()
+    fetched = _fetch_input_auto(source, year, county, year_to)
+    return fetched, year, time.perf_counter() - start
+
+def _fetch_concurrently(tasks, county, workers=None):
+    """Fetch sources in a thread pool and return the fetched inputs with a status table.
+
+    Args:
+        tasks (list): Tuples of a data source, a label for its years, and
+            the first and last years to fetch. If the first year is None, the
+            year after the current maximum year of the source is fetched and
+            used as the label.
+        county (pandas.DataFrame): ``County`` table for the jail data.
+        workers (int): Number of tasks to run at the same time. If None, all at once.
+
+    Returns:
+        tuple: A list of fetched ``SimpleCount`` inputs in the order of
+            ``tasks`` and a status table as returned by ``get_source_status()``.
+    """
+    fetched_list = [None] * len(tasks)
+    status = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=workers or len(tasks)) as pool:
+        futures = {
+            pool.submit(_fetch_timed, source, year, county, year_to): i
+            for i, (source, label, year, year_to) in enumerate(tasks)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            source, label = tasks[i][:2]
+            try:
+                fetched, year, seconds = future.result()
+                label = year if label is None else label
+                if fetched is None:
+                    raise RuntimeError('No data is returned from the source!')
+                if fetched.empty:
+                    raise ValueError('No records found - Data may be up to date!')
+                fetched_list[i] = fetched
+                status[i] = (source, label, 'new rows', len(fetched), round(seconds, 1))
+            except ValueError as e:
+                if 'up to date' in str(e):
+                    status[i] = (source, label, 'up to date', 0, None)
+                else:
+                    status[i] = (source, label, f'failed: {e}', 0, None)
+            except Exception as e:
+                status[i] = (source, label, f'failed: {e}', 0, None)
+
+    fetched_list = [fetched for fetched in fetched_list if fetched is not None]
+    status = pd.DataFrame(status, columns=['source', 'year', 'status', 'rows', 'seconds'])
+    return fetched_list, status
 
 def _create_temp(simplecount_input):
     """Create temporary tables of the cleaned simplecount data.
@@ -676,19 +926,38 @@ def _create_temp(simplecount_input):
     except:
         raise
 
+def _get_outputs_in_temp():
+    """Return a list of output ids whose indicators appear in the temporary simplecount table."""
+    global _TEMP_NAME
+
+    sql = f'SELECT DISTINCT i.fk_indicator_output FROM {_TEMP_NAME} AS t ' +\
+        'JOIN Indicator AS i ON t.fk_simplecount_indicator = i.id;'
+
+    try:
+        c = _CONN.cursor()
+        out_id_list = [i[0] for i in c.execute(sql).fetchall()]
+        c.close()
+        return out_id_list
+    except:
+        print(f'ERROR: Failed SQL query attempt: "{sql}"')
+        raise
+
 def _add_to_master():
     """Append the temporary simplecount table to the master table.
     
     This function calls another function with the same name from the
     ``database`` module to append the temporary simplecount table
     (``TempSimpleCount``) to the master ``SimpleCount`` table in the SQL
-    database (``@/database/cjia_webdata.db``).
+    database (``@/database/cjia_webdata.db``). Output ids affected by the
+    update are recorded for ``get_updated_outputs()``.
     
     """
     global _TEMP_NAME
     global _NAME
+    global _UPDATED_OUTPUTS
 
     try:
+        _UPDATED_OUTPUTS = _get_outputs_in_temp()
         database.add_to_master(_TEMP_NAME, _NAME)
     except:
         raise ValueError(f'ERROR: Cannot add {_TEMP_NAME} table to {_NAME} table in the database!')
@@ -735,6 +1004,118 @@ def fetch_input_and_create_temp(source=None, auto=False):
         print(e)
         return False
 
+def fetch_all_and_create_temp(sources=None, workers=None):
+    """Fetch multiple data sources concurrently and create one temporary table.
+
+    The ``County`` table is read from the database first. Sources are then
+    fetched and transformed in a thread pool, so the whole update takes
+    about as long as the slowest source. Each task looks up the next year to
+    fetch for its source, so that a failed lookup only fails that source.
+    The results are staged into the temporary tables at once, and a status
+    table of the sources is printed and kept for ``get_source_status()``.
+
+    Args:
+        sources (list): Data sources to fetch. If None, all sources are fetched.
+        workers (int): Number of sources to fetch at the same time. If None, all at once.
+
+    Returns:
+        bool: True if any new records are staged, False otherwise.
+
+    """
+    global _SOURCE_OUTPUTS
+    global _SOURCE_STATUS
+
+    try:
+        sources = list(_SOURCE_OUTPUTS) if sources is None else sources
+        for source in sources:
+            if source not in _SOURCE_OUTPUTS:
+                raise ValueError(f'ERROR: Invalid data source "{source}"!')
+
+        county = database.fetch_tables(['County'])[0]
+
+        tasks = [(source, None, None, None) for source in sources]
+        fetched_list, _SOURCE_STATUS = _fetch_concurrently(tasks, county, workers)
+        print(_SOURCE_STATUS.to_string(index=False))
+
+        if len(fetched_list) == 0:
+            print('WARNING: No new records are found for the selected sources.')
+            return False
+
+        _create_temp(pd.concat(fetched_list, ignore_index=True)[_SIMPLECOUNT_COLUMNS])
+        return True
+    except Exception as e:
+        print(e)
+        return False
+
+def backfill_and_create_temp(year_from, year_to, sources=None, workers=8):
+    """Fetch multiple data sources for a range of years and create one temporary table.
+
+    This function works as ``fetch_all_and_create_temp()`` but fetches the
+    given years instead of the year after the current maximum year, e.g. to
+    catch up after a missed update or to rebuild a source after a change of
+    its definition. Each MS SQL Server source is fetched with a single range
+    query, while the other sources are fetched for every year at the same
+    time. Records already in the ``SimpleCount`` table are updated rather
+    than duplicated when the update is finalized.
+
+    Args:
+        year_from (int): First year to fetch.
+        year_to (int): Last year to fetch.
+        sources (list): Data sources to fetch. If None, all sources are fetched.
+        workers (int): Number of fetches to run at the same time.
+
+    Returns:
+        bool: True if any new records are staged, False otherwise.
+
+    """
+    global _SOURCE_OUTPUTS
+    global _SOURCE_STATUS
+    global _RANGE_SOURCES
+
+    try:
+        sources = list(_SOURCE_OUTPUTS) if sources is None else sources
+        for source in sources:
+            if source not in _SOURCE_OUTPUTS:
+                raise ValueError(f'ERROR: Invalid data source "{source}"!')
+        year_from, year_to = int(year_from), int(year_to)
+        if year_from > year_to:
+            raise ValueError('ERROR: The first year must not be after the last year!')
+
+        county = database.fetch_tables(['County'])[0]
+
+        tasks = []
+        for source in sources:
+            if source in _RANGE_SOURCES:
+                tasks.append((source, f'{year_from}-{year_to}', year_from, year_to))
+            else:
+                tasks += [(source, str(year), year, None) for year in range(year_from, year_to+1)]
+
+        fetched_list, _SOURCE_STATUS = _fetch_concurrently(tasks, county, workers)
+        print(_SOURCE_STATUS.to_string(index=False))
+
+        if len(fetched_list) == 0:
+            print('WARNING: No records are found for the selected sources and years.')
+            return False
+
+        _create_temp(pd.concat(fetched_list, ignore_index=True)[_SIMPLECOUNT_COLUMNS])
+        return True
+    except Exception as e:
+        print(e)
+        return False
+
+def get_source_status():
+    """Return the status of each source in the latest multi-source fetch.
+
+    Returns:
+        pandas.DataFrame: ``source``, ``year``, ``status`` ("new rows", "up to date"
+            or "failed: ..."), ``rows`` and ``seconds`` columns, with a row per
+            fetch, or None if no multi-source fetch has been made since ``init()``.
+            For ``backfill_and_create_temp()``, ``year`` is a label such as
+            "2015" or "2015-2020".
+    """
+    global _SOURCE_STATUS
+    return _SOURCE_STATUS
+
 def finalize_update():
     """Fianlize the updating of the ``SimpleCount`` table.
 
@@ -754,3 +1135,12 @@ def finalize_update():
         print(e)
         return False
 
+def get_updated_outputs():
+    """Return a list of output ids affected by the latest finalized update.
+
+    Returns:
+        list: Output IDs as in the ``Output`` table in database, or None if
+            no update has been finalized since ``init()``.
+    """
+    global _UPDATED_OUTPUTS
+    return _UPDATED_OUTPUTS
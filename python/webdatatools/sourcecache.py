@@ -0,0 +1,167 @@
+"""Offer functions for caching transformed source data on the drive.
+
+This module offer functions to keep the transformed data of automatic
+updates, i.e. ``SimpleCount`` and ``Population`` inputs, in a cache
+directory. Each cached table is keyed by its data source, year and a
+fingerprint of the source files it was transformed from, so that a table is
+reused only if the source has not changed since, e.g. when an update is
+retried after its temporary output is rejected. Tables are stored in the
+Feather format if ``pyarrow`` is installed and as pickles otherwise, and the
+least recently used tables are deleted when the cache grows over its size
+limit. The module is intended to be used by the ``simplecount`` and
+``population`` modules rather than directly imported by the main program.
+
+The module contains the following public functions to be called externally:
+
+``configure()`` sets the cache directory and size limit.
+``get_fingerprint()`` returns a fingerprint of source file contents.
+``load()`` returns a cached table, or None if not cached.
+``store()`` caches a table.
+``clear_cache()`` deletes all cached tables.
+"""
+import hashlib
+import os
+import pandas as pd
+import re
+import threading
+
+_CACHE_DIR = 'P:\\DATA\\CJIA_WebData\\cache\\source'
+_MAX_BYTES = 512 * 1024 * 1024
+_LOCK = threading.Lock()
+
+def configure(cache_dir=None, max_bytes=None):
+    """Set where tables are cached and how large the cache can grow.
+
+    Args:
+        cache_dir (str): Directory of the cache. If None, it is not changed.
+        max_bytes (int): Size limit of the cache in bytes. If None, it is not changed.
+    """
+    global _CACHE_DIR
+    global _MAX_BYTES
+
+    if cache_dir is not None:
+        _CACHE_DIR = cache_dir
+    if max_bytes is not None:
+        _MAX_BYTES = max_bytes
+
+def _get_format():
+    """Return "feather" if ``pyarrow`` is installed, "pickle" otherwise."""
+    try:
+        import pyarrow
+        return 'feather'
+    except ImportError:
+        return 'pickle'
+
+def _get_prefix(source, year):
+    """Return the file name prefix of the cached tables of a source and year."""
+    return re.sub(r'[^\w-]', '_', f'{source}_{year}') + '_'
+
+def _get_path(source, year, fingerprint, fmt):
+    """Return the path to a cached table."""
+    return os.path.join(_CACHE_DIR, f'{_get_prefix(source, year)}{fingerprint[:32]}.{fmt}')
+
+def get_fingerprint(contents, version=None):
+    """Return a fingerprint of source file contents.
+
+    Args:
+        contents (list): Contents of the source files as bytes.
+        version: Version of the transformation, so that tables cached by an
+            older transformation are not reused.
+
+    Returns:
+        str: A hexadecimal SHA-256 digest.
+    """
+    h = hashlib.sha256(repr(version).encode('utf-8'))
+    for content in contents:
+        h.update(len(content).to_bytes(8, 'little'))
+        h.update(content)
+    return h.hexdigest()
+
+def load(source, year, fingerprint):
+    """Return a cached table, or None if not cached.
+
+    Args:
+        source (str): Data source.
+        year: Year or other label of the source data.
+        fingerprint (str): Fingerprint of the source files as returned by ``get_fingerprint()``.
+
+    Returns:
+        pandas.DataFrame: The cached table, or None.
+    """
+    try:
+        for fmt in ['feather', 'pickle']:
+            path = _get_path(source, year, fingerprint, fmt)
+            if not os.path.isfile(path):
+                continue
+            if fmt == 'feather' and _get_format() != 'feather':
+                continue
+
+            try:
+                df = pd.read_feather(path) if fmt == 'feather' else pd.read_pickle(path)
+            except Exception:
+                print(f'WARNING: Cannot read the cached "{source}" data for {year} - Fetching again...')
+                return None
+
+            os.utime(path)
+            print(f'NOTE: Using the cached "{source}" data for {year}.')
+            return df
+        return None
+    except:
+        raise
+
+def _evict(keep):
+    """Delete the least recently used tables but ``keep`` until the cache is within its size limit."""
+    entries = []
+    for filename in os.listdir(_CACHE_DIR):
+        path = os.path.join(_CACHE_DIR, filename)
+        if filename.endswith(('.feather', '.pickle')) and path != keep:
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = os.path.getsize(keep) + sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= _MAX_BYTES:
+            break
+        os.remove(path)
+        total -= size
+
+def store(source, year, fingerprint, df):
+    """Cache a table, replacing tables cached for the source and year from other source files.
+
+    Args:
+        source (str): Data source.
+        year: Year or other label of the source data.
+        fingerprint (str): Fingerprint of the source files as returned by ``get_fingerprint()``.
+        df (pandas.DataFrame): Transformed data.
+    """
+    try:
+        fmt = _get_format()
+        path = _get_path(source, year, fingerprint, fmt)
+        prefix = _get_prefix(source, year)
+
+        with _LOCK:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            for filename in os.listdir(_CACHE_DIR):
+                if filename.startswith(prefix):
+                    os.remove(os.path.join(_CACHE_DIR, filename))
+
+            df = df.reset_index(drop=True)
+            if fmt == 'feather':
+                df.to_feather(f'{path}.tmp')
+            else:
+                df.to_pickle(f'{path}.tmp', compression=None)
+            os.replace(f'{path}.tmp', path)
+            _evict(path)
+    except Exception as e:
+        print(f'WARNING: Cannot cache the "{source}" data for {year}: {e}')
+
+def clear_cache():
+    """Delete all cached tables."""
+    try:
+        with _LOCK:
+            if os.path.isdir(_CACHE_DIR):
+                for filename in os.listdir(_CACHE_DIR):
+                    if filename.endswith(('.feather', '.pickle', '.tmp')):
+                        os.remove(os.path.join(_CACHE_DIR, filename))
+    except:
+        raise
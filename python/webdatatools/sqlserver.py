@@ -0,0 +1,219 @@
+"""Offer functions for querying the MS SQL Server through pooled connections.
+
+This module offer functions to query source databases in the MS SQL Server
+(SPAC2SVR). Connections are kept in a pool per database name and reused
+across queries, so that multi-source and multi-year updates do not connect
+again for every query. A connection is checked with a simple query before
+it is reused, and the time taken by every query is recorded. Connections
+are made by a factory that takes a database name and returns any DB-API
+connection, so that a local database with the same table shape, e.g. SQLite,
+can stand in for the server. The module is intended to be used by the
+``simplecount`` module rather than directly imported by the main program.
+
+The module contains the following public functions to be called externally:
+
+``configure()`` sets the connection factory, table name format and pool size.
+``connection()`` checks out a pooled connection to a database as a context manager.
+``qualify()`` returns a table name qualified with its database.
+``query()`` returns the result of a query.
+``iter_query()`` yields the result of a query in chunks of rows.
+``get_query_stats()`` returns query counts and timings per database.
+``close_all()`` closes all pooled connections.
+"""
+import contextlib
+import pandas as pd
+import pyodbc
+import threading
+import time
+
+_CONNECT = lambda database: pyodbc.connect(
+    f'DRIVER=SQL Server;SERVER=SPAC2SVR;PORT=1433;DATABASE={database}'
+)
+_TABLE_FORMAT = '{database}.dbo.{table}'
+_POOL_SIZE = 4
+_POOLS = {}
+_STATS = {}
+_LOCK = threading.Lock()
+
+def configure(connect=None, table_format=None, pool_size=None):
+    """Set how connections are made and pooled.
+
+    Pooled connections made by the previous factory are closed.
+
+    Args:
+        connect (function): Takes a database name and returns a DB-API connection.
+            If None, the factory is not changed.
+        table_format (str): Format of qualified table names with ``{database}``
+            and ``{table}`` placeholders, e.g. "{table}" for SQLite. If None,
+            the format is not changed.
+        pool_size (int): Maximum number of idle connections kept per database.
+            If None, the size is not changed.
+    """
+    global _CONNECT
+    global _TABLE_FORMAT
+    global _POOL_SIZE
+
+    close_all()
+    if connect is not None:
+        _CONNECT = connect
+    if table_format is not None:
+        _TABLE_FORMAT = table_format
+    if pool_size is not None:
+        _POOL_SIZE = pool_size
+
+def qualify(database, table):
+    """Return a table name qualified with its database, e.g. "PrisonMain.dbo.PrisonAdmits"."""
+    return _TABLE_FORMAT.format(database=database, table=table)
+
+def _get_stats(database):
+    """Return the statistics record of a database, creating it if needed."""
+    if database not in _STATS:
+        _STATS[database] = {'connections': 0, 'reused': 0, 'queries': 0, 'rows': 0, 'seconds': 0.0}
+    return _STATS[database]
+
+def _close_quietly(conn):
+    """Close a connection, ignoring errors from a connection that is already broken."""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_healthy(conn):
+    """Return True if a connection can still run a simple query."""
+    try:
+        c = conn.cursor()
+        c.execute('SELECT 1')
+        c.fetchall()
+        c.close()
+        return True
+    except Exception:
+        return False
+
+def _checkout(database):
+    """Return a healthy pooled connection to a database, or a new one if none is idle."""
+    while True:
+        with _LOCK:
+            pool = _POOLS.get(database, [])
+            conn = pool.pop() if len(pool) > 0 else None
+        if conn is None:
+            break
+        if _is_healthy(conn):
+            with _LOCK:
+                _get_stats(database)['reused'] += 1
+            return conn
+        _close_quietly(conn)
+
+    conn = _CONNECT(database)
+    with _LOCK:
+        _get_stats(database)['connections'] += 1
+    return conn
+
+def _checkin(database, conn):
+    """Return a connection to the pool of its database, or close it if the pool is full."""
+    try:
+        conn.rollback()
+    except Exception:
+        _close_quietly(conn)
+        return
+
+    with _LOCK:
+        pool = _POOLS.setdefault(database, [])
+        if len(pool) < _POOL_SIZE:
+            pool.append(conn)
+            return
+    _close_quietly(conn)
+
+@contextlib.contextmanager
+def connection(database):
+    """Check out a pooled connection to a database for the duration of a ``with`` block.
+
+    The connection is returned to the pool when the block ends, or closed
+    if the block raises an error, since it may be left in a broken state.
+
+    Args:
+        database (str): Database in the MS SQL Server (SPAC2SVR).
+
+    Yields:
+        A DB-API connection.
+    """
+    conn = _checkout(database)
+    try:
+        yield conn
+    except BaseException:
+        _close_quietly(conn)
+        raise
+    else:
+        _checkin(database, conn)
+
+def _record(database, rows, seconds):
+    """Record the number of rows and time taken by a query."""
+    with _LOCK:
+        stats = _get_stats(database)
+        stats['queries'] += 1
+        stats['rows'] += rows
+        stats['seconds'] += seconds
+    print(f'NOTE: Query on "{database}" returned {rows:,} rows in {seconds:.1f} seconds.')
+
+def query(database, sql, params=None):
+    """Return the result of a query on a database.
+
+    Args:
+        database (str): Database in the MS SQL Server (SPAC2SVR).
+        sql (str): Query with qualified table names.
+        params (list): Parameters of the query.
+
+    Returns:
+        pandas.DataFrame: The query result.
+    """
+    try:
+        with connection(database) as conn:
+            start = time.perf_counter()
+            df = pd.read_sql(sql, conn, params=params)
+            _record(database, len(df), time.perf_counter() - start)
+            return df
+    except:
+        raise
+
+def iter_query(database, sql, params=None, chunksize=100000):
+    """Yield the result of a query on a database in chunks of rows.
+
+    The connection stays checked out until all chunks are read.
+
+    Args:
+        database (str): Database in the MS SQL Server (SPAC2SVR).
+        sql (str): Query with qualified table names.
+        params (list): Parameters of the query.
+        chunksize (int): Number of rows per chunk.
+
+    Yields:
+        pandas.DataFrame: A chunk of the query result.
+    """
+    try:
+        with connection(database) as conn:
+            start = time.perf_counter()
+            rows = 0
+            for df in pd.read_sql(sql, conn, params=params, chunksize=chunksize):
+                rows += len(df)
+                yield df
+            _record(database, rows, time.perf_counter() - start)
+    except:
+        raise
+
+def get_query_stats():
+    """Return query counts and timings per database.
+
+    Returns:
+        dict: Database names mapped to dicts with the numbers of ``connections``
+            made and ``reused``, ``queries`` run, ``rows`` read and total ``seconds``.
+    """
+    with _LOCK:
+        return {database: dict(stats) for database, stats in _STATS.items()}
+
+def close_all():
+    """Close all pooled connections."""
+    with _LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        for conn in pool:
+            _close_quietly(conn)
@@ -10,6 +10,7 @@ The module contains the following public functions to be called externally:
 ``prompt_for_source_group_input()`` prompt for user inputs for dataset source group..
 ``prompt_for_data_source_input()`` prompt for user inputs for dataset source to automatically update the database..
 ``prompt_for_simplecount_input()`` prompt for user inputs for updating method for simplecount estimates..
+``prompt_for_year_range_input()`` prompt for user input for a range of years to backfill.
 ``prompt_for_population_input()`` prompt for user inputs for updating method for population estimates..
 ``prompt_for_dataset_package_input()`` prompt for user input for generating packaged output datasets.
 ``prompt_for_new_task()`` prompts for user input for continuing to carry out a new task.
@@ -71,9 +72,10 @@ def prompt_for_task_input():
     msg = '\nChoose the task you want to carry out:' +\
         '\n- 1 - Update the "simplecount" table in the database.' +\
         '\n- 2 - Update the "population" table in the database.' +\
-        '\n- 3 - Generate a dataset/datasets of your choice.'
+        '\n- 3 - Generate a dataset/datasets of your choice.' +\
+        '\n- 4 - Remove duplicate records blocking updates of the database.'
     
-    choice_range = range(1,3+1)
+    choice_range = range(1,4+1)
     prompt = 'Task to carry out'
     msg, choice_list = _complete_choices(msg, choice_range, prompt, back=False)
     errmsg = 'ERROR: Invalid choice for task! Try again.'
@@ -121,7 +123,7 @@ def prompt_for_source_group_input(purpose, auto=False):
         msg += f'\n- {i} - {source_group_dict[i]}.'
 
     prompt = 'Source group'
-    msg, choice_list = _complete_choices(msg, choice_range, prompt)
+    msg, choice_list = _complete_choices(msg, choice_range, prompt, all=auto)
     errmsg = 'ERROR: Invalid choice for source group! Try again.'
     isvalid = lambda x: x in choice_list
 
@@ -174,9 +176,10 @@ def prompt_for_simplecount_input():
     msg = '\nSpecify the method type for updating simplecount table data.' +\
         ' Choices for the method type include:' +\
         '\n- 1 - Automatically update database records from select data sources.' +\
-        '\n- 2 - Manually provide input data for updating database records.'
+        '\n- 2 - Manually provide input data for updating database records.' +\
+        '\n- 3 - Automatically backfill database records for a range of years from select data sources.'
 
-    choice_range = range(1, 2+1)
+    choice_range = range(1, 3+1)
     prompt = 'Method type'
     msg, choice_list = _complete_choices(msg, choice_range, prompt)
     errmsg = 'ERROR: Invalid choice for method type! Try again.'
@@ -190,6 +193,33 @@ def prompt_for_simplecount_input():
         else:
             return user_input
 
+def prompt_for_year_range_input():
+    """Prompt for user input for a range of years and return the first and last years."""
+    msg = '\nSpecify the range of years to backfill as "YYYY-YYYY", e.g. "2015-2020",' +\
+        ' or a single year as "YYYY".' +\
+        '\n- b - Back to the main menu.' +\
+        '\n- q - Exit the program.\n\n> Years? [YYYY-YYYY/YYYY/b/q]'
+    errmsg = 'ERROR: Invalid range of years! Try again.'
+
+    def isvalid(x):
+        if x in ['b', 'q']:
+            return True
+        years = x.split('-')
+        if len(years) not in [1, 2] or not all(len(y) == 4 and y.isdigit() for y in years):
+            return False
+        return int(years[0]) <= int(years[-1])
+
+    while True:
+        user_input = _prompt(msg, errmsg, isvalid)
+        if user_input == 'q':
+            _exit_handler()
+            continue
+        elif user_input == 'b':
+            return user_input
+        else:
+            years = user_input.split('-')
+            return int(years[0]), int(years[-1])
+
 def prompt_for_population_input():
     """Prompt for user input for updating method for population estimates."""
     msg = '\nSpecify the method type for updating population data.' +\